@@ -2,8 +2,6 @@
 
 # OpenAI Settings
 API_KEY = "wpisz_swoj_klucz_API_tutaj"
-import openai
-openai.api_key = APIKey
 
 """
 Asystent z Function Calling do:
@@ -15,6 +13,7 @@ from openai import OpenAI
 from pydantic import BaseModel, Field
 import pandas as pd
 import sqlite3
+import threading
 import json
 
 # Przykładowy DataFrame (na bazie moich poprzednich projektów)
@@ -50,8 +49,8 @@ def create_sample_data():
     return products, orders
 
 def create_sqlite_db(products: pd.DataFrame, orders: pd.DataFrame) -> sqlite3.Connection:
-    """Tworzy bazę SQLite z podanymi DataFrame'ami."""
-    conn = sqlite3.connect(':memory:')
+    """Tworzy bazę SQLite z podanymi DataFrame'ami (współdzieloną między wątkami, zapytania pod db_lock)."""
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
     products.to_sql('products', conn, index=False, if_exists='replace')
     orders.to_sql('orders', conn, index=False, if_exists='replace')
     return conn
@@ -60,6 +59,7 @@ def create_sqlite_db(products: pd.DataFrame, orders: pd.DataFrame) -> sqlite3.Co
 
 products_df, orders_df = create_sample_data()
 db_connection = create_sqlite_db(products_df, orders_df)
+db_lock = threading.Lock()
 
 print("Załadowane tabele:")
 print(f"      - products: {products_df.shape[0]} wierszy")
@@ -143,7 +143,8 @@ def execute_sql_query(sql_query: SQLQuery) -> dict:
         if not sql_query.query.strip().upper().startswith('SELECT'):
             return {"error": "Tylko zapytania SELECT są dozwolone."}
         
-        df = pd.read_sql_query(sql_query.query, db_connection)
+        with db_lock:
+            df = pd.read_sql_query(sql_query.query, db_connection)
         
         return {
             "success": True,
@@ -249,8 +250,20 @@ tool_functions = {
 class DatabaseAssistant:
     """Asystent do odpytywania bazy danych z użyciem function calling OpenAI."""
     
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=APIKey)
+    def __init__(self, api_key: str, base_url: str | None = None, model: str = "gpt-4o", verbose: bool = True,
+                 client: OpenAI | None = None):
+        """
+        Args:
+            api_key: Klucz API OpenAI
+            base_url: Inny endpoint zgodny z OpenAI (np. lokalny serwer w benchmarkach)
+            model: Nazwa modelu z obsługą tool_calls
+            verbose: Czy wypisywać wywołania narzędzi
+            client: Gotowy klient OpenAI współdzielony przez wiele rozmów (np. sesje
+                    w chat_service) - jedna pula połączeń zamiast osobnej na rozmowę
+        """
+        self.client = client if client is not None else OpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+        self.verbose = verbose
         self.conversation_history = []
         
         # system prompt z informacjami o tabelach
@@ -284,7 +297,7 @@ class DatabaseAssistant:
         
         while True:
             response = self.client.chat.completions.create(
-                model="gpt-4o",
+                model=self.model,
                 messages=messages,
                 tools=tools,
                 tool_choice="auto"
@@ -303,12 +316,14 @@ class DatabaseAssistant:
                     function_name = tool_call.function.name
                     function_args = json.loads(tool_call.function.arguments)
                     
-                    print(f"Wywołuję: {function_name} z argumentami {function_args}")
+                    if self.verbose:
+                        print(f"Wywołuję: {function_name} z argumentami {function_args}")
                     
                     # wykonanie funkcji
                     result = tool_functions[function_name](function_args)
                     
-                    print(f" Wynik: {len(result.get('data', []))} rekordów" if 'data' in result else f"Wynik: {result}")
+                    if self.verbose:
+                        print(f" Wynik: {len(result.get('data', []))} rekordów" if 'data' in result else f"Wynik: {result}")
                     
                     # dodanie wyników do wiadomości
                     
@@ -324,61 +339,57 @@ class DatabaseAssistant:
                 return answer
 
 
-API_KEY = APIKey
-assistant = DatabaseAssistant(API_KEY)
+# Czat (ipywidgets) - tylko przy uruchomieniu skryptu / w notebooku, nie przy imporcie (np. w benchmarkach)
 
+if __name__ == "__main__":
+    assistant = DatabaseAssistant(API_KEY)
+
+    import ipywidgets as widgets
+    from IPython.display import display, Markdown, clear_output
+    from ipywidgets import VBox, HBox, Layout         
 
-import ipywidgets as widgets
-from IPython.display import display, Markdown, clear_output
-from ipywidgets import VBox, HBox, Layout         
-            
     # UI (ipywidgets)
 
-input_box = widgets.Text(
-    placeholder='Napisz pytanie, np. "Jak często podlewać monsterę?"',
-    description='Ty:',
-    layout=Layout(width='70%')
-)
-send_button = widgets.Button(
-    description='Wyślij',
-    button_style='success',
-    layout=Layout(width='14%')
-)
-reset_button = widgets.Button(
-    description='Nowa rozmowa',
-    button_style='warning',
-    layout=Layout(width='14%')
-)
-chat_output = widgets.Output(
-    layout={'border': '1px solid gray', 'height': '360px', 'overflow_y': 'auto', 'padding': '6px'}
+    input_box = widgets.Text(
+        placeholder='Napisz pytanie, np. "Jak często podlewać monsterę?"',
+        description='Ty:',
+        layout=Layout(width='70%')
     )
+    send_button = widgets.Button(
+        description='Wyślij',
+        button_style='success',
+        layout=Layout(width='14%')
+    )
+    reset_button = widgets.Button(
+        description='Nowa rozmowa',
+        button_style='warning',
+        layout=Layout(width='14%')
+    )
+    chat_output = widgets.Output(
+        layout={'border': '1px solid gray', 'height': '360px', 'overflow_y': 'auto', 'padding': '6px'}
+        )
 
-def on_send_clicked(_):
-    with chat_output:
-        user_message = input_box.value.strip()
-        if not user_message:
-            return
-        display(Markdown(f"**👤 Ty:** {user_message}"))
-        answer = assistant.ask(user_message)
-        display(Markdown(f"**🤖 Asystent:** {answer}"))
-        input_box.value = ""
-
-def on_reset_clicked(_):
-    global assistant
-    assistant = DatabaseAssistant(api_key=APIKey)
-    with chat_output:
-        clear_output()
-        display(Markdown("🆕 **Rozpoczęto nową rozmowę z asystentem _Zielony Doom_.**"))
-
-send_button.on_click(on_send_clicked)
-reset_button.on_click(on_reset_clicked)
+    def on_send_clicked(_):
+        with chat_output:
+            user_message = input_box.value.strip()
+            if not user_message:
+                return
+            display(Markdown(f"**👤 Ty:** {user_message}"))
+            answer = assistant.ask(user_message)
+            display(Markdown(f"**🤖 Asystent:** {answer}"))
+            input_box.value = ""
 
-display(VBox([
-    chat_output,
-    HBox([input_box, send_button, reset_button])
-]))
-            
-            
-            
+    def on_reset_clicked(_):
+        global assistant
+        assistant = DatabaseAssistant(api_key=API_KEY)
+        with chat_output:
+            clear_output()
+            display(Markdown("🆕 **Rozpoczęto nową rozmowę z asystentem _Zielony Doom_.**"))
 
+    send_button.on_click(on_send_clicked)
+    reset_button.on_click(on_reset_clicked)
 
+    display(VBox([
+        chat_output,
+        HBox([input_box, send_button, reset_button])
+    ]))
@@ -0,0 +1,201 @@
+"""
+Semantyczny cache odpowiedzi.
+
+Pytania o dostawę, zwroty czy podlewanie wracają w różnych sformułowaniach
+("Ile kosztuje dostawa?", "Jaki jest koszt wysyłki?"). Cache trzyma
+embedding pytania i gotową (zwalidowaną) odpowiedź; nowe pytanie o
+podobieństwie >= threshold do zapamiętanego dostaje odpowiedź z cache
+bez retrievalu, generacji i walidacji.
+
+- wpisy wygasają po ttl sekundach,
+- rozmiar jest ograniczony (max_size, wyrzucany najdawniej używany wpis),
+- każdy wpis pamięta ID faktów, z których powstała odpowiedź -
+  invalidate_facts() usuwa wpisy zależne od zmienionych faktów, a po
+  dodaniu faktów (nowy fakt może być lepszym źródłem dowolnej odpowiedzi)
+  czyści cały cache,
+- każda zmiana bazy podbija generation: wywołujący odczytuje ją przed
+  retrievalem i przekazuje do put(), więc odpowiedź zbudowana ze starych
+  faktów (zmiana w trakcie generacji) nie trafia do cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval import normalize_embeddings
+
+
+class SemanticAnswerCache:
+    """
+    Cache odpowiedzi kluczowany embeddingiem pytania (podobieństwo kosinusowe).
+
+    Przykład:
+        cache = SemanticAnswerCache(threshold=0.92, ttl=3600, max_size=256)
+        kb.add_listener(cache.invalidate_facts)
+        answer = cache.get(query_embedding)            # None = brak trafienia
+        generation = cache.generation                  # przed retrievalem
+        ...
+        cache.put(query_embedding, answer, fact_ids, generation=generation)
+    """
+
+    def __init__(self, threshold=0.92, ttl=3600, max_size=256, clock=time.monotonic):
+        """
+        Args:
+            threshold: Minimalne podobieństwo pytań, przy którym zwracamy odpowiedź z cache
+            ttl: Czas życia wpisu w sekundach (None = bez wygasania)
+            max_size: Maksymalna liczba wpisów (0 = cache wyłączony)
+            clock: Źródło czasu (do testów)
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+
+        self._matrix = None
+        self._free = list(range(max_size))[::-1]
+        self._entries = OrderedDict()
+        self._by_fact = {}
+        self._lock = threading.Lock()
+
+        # licznik zmian bazy wiedzy (invalidate_facts / clear)
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.expired = 0
+        self.stale_puts = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, slot):
+        """Usuwa wpis (wywoływane pod blokadą)."""
+        entry = self._entries.pop(slot)
+        for fact_id in entry["fact_ids"]:
+            slots = self._by_fact.get(fact_id)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._by_fact[fact_id]
+        self._free.append(slot)
+
+    def get(self, query_embedding):
+        """
+        Zwraca odpowiedź dla najbardziej podobnego pytania z cache albo None.
+
+        Args:
+            query_embedding: Embedding pytania (dim,)
+        """
+        query = normalize_embeddings(np.atleast_2d(query_embedding))[0]
+
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            now = self._clock()
+            for slot in [slot for slot, entry in self._entries.items() if entry["expires_at"] <= now]:
+                self._drop(slot)
+                self.expired += 1
+
+            slots = np.fromiter(self._entries, dtype=np.int64, count=len(self._entries))
+            if len(slots) == 0:
+                self.misses += 1
+                return None
+
+            scores = self._matrix[slots] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            slot = int(slots[best])
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return self._entries[slot]["answer"]
+
+    def put(self, query_embedding, answer, fact_ids, generation=None):
+        """
+        Zapamiętuje odpowiedź (tylko zwalidowane - o tym decyduje wywołujący).
+
+        Args:
+            query_embedding: Embedding pytania (dim,)
+            answer: Odpowiedź (str)
+            fact_ids: ID faktów, na których oparta jest odpowiedź
+            generation: self.generation odczytane przed retrievalem - jeśli baza
+                        zmieniła się od tego czasu, odpowiedź nie jest zapisywana
+        """
+        if self.max_size <= 0:
+            return
+
+        query = normalize_embeddings(np.atleast_2d(query_embedding))[0]
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, query.shape[0]), dtype=np.float32)
+
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+
+            slot = self._free.pop()
+            self._matrix[slot] = query
+            expires_at = self._clock() + self.ttl if self.ttl is not None else float("inf")
+            self._entries[slot] = {"answer": answer, "fact_ids": frozenset(fact_ids), "expires_at": expires_at}
+            for fact_id in fact_ids:
+                self._by_fact.setdefault(fact_id, set()).add(slot)
+
+    def invalidate_facts(self, fact_ids, added=False):
+        """
+        Słuchacz zmian bazy wiedzy (kb.add_listener).
+
+        Args:
+            fact_ids: ID zmienionych faktów
+            added: True = fakty dodane (kb.add) - usuwane są wszystkie wpisy;
+                   False = update / remove - wpisy zbudowane z tych faktów
+        """
+        with self._lock:
+            self.generation += 1
+            if added:
+                slots = set(self._entries)
+            else:
+                slots = set()
+                for fact_id in fact_ids:
+                    slots |= self._by_fact.get(fact_id, set())
+            for slot in slots:
+                self._drop(slot)
+            self.invalidated += len(slots)
+
+    def clear(self):
+        """Czyści cache (liczniki zostają)."""
+        with self._lock:
+            self.generation += 1
+            for slot in list(self._entries):
+                self._drop(slot)
+
+    def stats(self):
+        """
+        Zwraca statystyki cache.
+
+        Returns:
+            dict: hits, misses, hit_rate, size, max_size, invalidated, expired,
+                  stale_puts (odpowiedzi pominięte, bo baza zmieniła się w trakcie generacji)
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "invalidated": self.invalidated,
+                "expired": self.expired,
+                "stale_puts": self.stale_puts,
+            }
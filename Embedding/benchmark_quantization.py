@@ -0,0 +1,116 @@
+"""
+Benchmark kwantyzacji embeddingów (float16 / int8) względem dokładnego wyszukiwania.
+
+Raportuje dla każdego backendu:
+- pamięć embeddingów w RAM i oszczędność względem float32,
+- recall@k względem dokładnego wyszukiwania (tak jak find_relevant_facts),
+- średni czas zapytania.
+
+Uruchomienie (w katalogu Embedding):
+    python benchmark_quantization.py
+    python benchmark_quantization.py --size 100000 --rescore-factor 2
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from rag_engine import EMBEDDING_MODEL_NAME, knowledge_base
+from retrieval import DenseRetriever, QuantizedRetriever, normalize_embeddings
+
+TEST_QUERIES = [
+    "Jak podlewać monsterę?",
+    "Jakie macie rośliny na półki?",
+    "półki",
+    "Ile kosztuje dostawa?",
+    "Czy mogę zwrócić roślinę?",
+    "Roślina do ciemnego pokoju",
+    "Co zrobić gdy fikus zrzuca liście?",
+    "Jak często nawozić rośliny?",
+    "Czy wysyłacie zimą?",
+    "Jaka roślina dla początkującego?",
+    "Jak skontaktować się ze sklepem?",
+    "Czy macie doniczki ceramiczne?",
+    "Storczyk - jakie podłoże?",
+    "Roślina do łazienki",
+    "Co oczyszcza powietrze?",
+    "Roślina dotarła uszkodzona",
+]
+
+
+def synthetic_embeddings(base, size, noise, seed=0):
+    """
+    Powiększa bazę do size wektorów: losowe fakty bazowe + szum gaussowski.
+
+    Args:
+        base: Znormalizowane embeddingi prawdziwej bazy wiedzy (n, dim)
+        size: Docelowa liczba wektorów (int)
+        noise: Odchylenie standardowe szumu (float)
+
+    Returns:
+        np.ndarray: Znormalizowana macierz float32 (size, dim)
+    """
+    if size <= len(base):
+        return base[:size]
+
+    rng = np.random.default_rng(seed)
+    extra = base[rng.integers(0, len(base), size - len(base))]
+    extra = extra + rng.normal(scale=noise, size=extra.shape).astype(np.float32)
+    return normalize_embeddings(np.vstack([base, extra]))
+
+
+def recall_at_k(reference, found):
+    """Średni udział wyników dokładnych odnalezionych przez backend."""
+    hits = [len(set(ref) & set(res)) / len(ref) for ref, res in zip(reference, found)]
+    return float(np.mean(hits))
+
+
+def timed_search(retriever, queries, top_k):
+    """Zwraca (indeksy, średni czas pojedynczego zapytania w ms)."""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        indices, _ = retriever.search(query, top_k=top_k)
+        results.append(indices)
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kwantyzacji embeddingów")
+    parser.add_argument("--size", type=int, default=0,
+                        help="Liczba wektorów (0 = tylko prawdziwa baza wiedzy)")
+    parser.add_argument("--noise", type=float, default=0.05, help="Szum dla wektorów syntetycznych")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    base = normalize_embeddings(model.encode(knowledge_base))
+    queries = normalize_embeddings(model.encode(TEST_QUERIES))
+
+    embeddings = synthetic_embeddings(base, args.size, args.noise) if args.size else base
+    print(f"Baza: {embeddings.shape[0]} wektorów x {embeddings.shape[1]} wymiarów, "
+          f"{len(queries)} zapytań, top_k={args.top_k}\n")
+
+    exact = DenseRetriever(embeddings, normalized=True)
+    reference, exact_ms = timed_search(exact, queries, args.top_k)
+    float_bytes = exact.memory_bytes()
+
+    print(f"{'backend':<10} {'pamięć [MB]':>12} {'oszczędność':>12} {'recall@' + str(args.top_k):>10} {'zapytanie [ms]':>15}")
+    print(f"{'float32':<10} {float_bytes / 2**20:>12.2f} {'-':>12} {1.0:>10.3f} {exact_ms:>15.3f}")
+
+    for dtype in ("float16", "int8"):
+        retriever = QuantizedRetriever(embeddings, dtype=dtype, normalized=True,
+                                       rescore_factor=args.rescore_factor)
+        found, ms = timed_search(retriever, queries, args.top_k)
+        saved = 1 - retriever.memory_bytes() / float_bytes
+        print(f"{dtype:<10} {retriever.memory_bytes() / 2**20:>12.2f} {saved:>11.0%} "
+              f"{recall_at_k(reference, found):>10.3f} {ms:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark skalowania wyszukiwania (find_relevant_facts) od 1 tys. do 1 mln faktów.
+
+Syntetyczne bazy wiedzy powstają z szablonów knowledge_base: fakty z podmienionymi
+nazwami roślin i liczbami. Dla każdego rozmiaru bazy i backendu z
+retrieval.INDEX_BACKENDS (exact / ivf / float16 / int8) raportuje:
+- czas kodowania faktów (model embeddingów),
+- czas budowy indeksu i pamięć indeksu,
+- czas zapytania pojedynczego (p50 / p95) i wsadowego (na zapytanie),
+- recall@k względem dokładnego wyszukiwania.
+
+Model embeddingów koduje co najwyżej --encode-pool różnych faktów (czas
+kodowania większych baz jest ekstrapolowany z przepustowości); większe bazy
+powstają z tej puli z szumem gaussowskim, porcjami, żeby 1 mln x 384 float32
+(~1.5 GB) zmieścił się w RAM. Zapytania: TEST_QUERIES z benchmark_quantization
+oraz zaszumione wektory losowych faktów (--queries).
+
+Uruchomienie (w katalogu Embedding):
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --sizes 1000,10000,100000,1000000 --backends exact,ivf,int8 --json wyniki.json
+"""
+
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from benchmark_quantization import TEST_QUERIES, recall_at_k
+from rag_engine import EMBEDDING_MODEL_NAME, PLANT_NAMES, knowledge_base
+from retrieval import DenseRetriever, INDEX_BACKENDS, load_or_build_index, normalize_embeddings
+
+PLANT_PATTERN = re.compile("|".join(re.escape(name) for name in sorted(PLANT_NAMES, key=len, reverse=True)),
+                           re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def synthetic_facts(size, seed=0):
+    """
+    Generuje size faktów z szablonów knowledge_base (inne rośliny i liczby).
+
+    Returns:
+        list[str]: Fakty (pierwsze len(knowledge_base) to oryginały)
+    """
+    rng = np.random.default_rng(seed)
+    facts = list(knowledge_base[:size])
+    for i in range(len(facts), size):
+        template = knowledge_base[i % len(knowledge_base)]
+        plant = PLANT_NAMES[rng.integers(len(PLANT_NAMES))]
+        fact = PLANT_PATTERN.sub(plant, template)
+        fact = NUMBER_PATTERN.sub(lambda match: str(rng.integers(1, 200)), fact)
+        facts.append(fact)
+    return facts
+
+
+def expand_embeddings(pool, size, noise, seed=0, chunk_size=100_000):
+    """
+    Buduje macierz size x dim: wiersze puli + szum gaussowski (porcjami, float32).
+
+    Returns:
+        np.ndarray: Znormalizowana macierz float32 (size, dim)
+    """
+    if size <= len(pool):
+        return pool[:size]
+
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((size, pool.shape[1]), dtype=np.float32)
+    matrix[:len(pool)] = pool
+    for start in range(len(pool), size, chunk_size):
+        stop = min(start + chunk_size, size)
+        rows = pool[rng.integers(0, len(pool), stop - start)]
+        rows += rng.standard_normal(rows.shape, dtype=np.float32) * noise
+        matrix[start:stop] = normalize_embeddings(rows)
+    return matrix
+
+
+def make_queries(real, embeddings, n_synthetic, noise, seed=1):
+    """Zapytania: embeddingi TEST_QUERIES + zaszumione wektory losowych faktów."""
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(embeddings[rng.integers(0, len(embeddings), n_synthetic)])
+    synthetic = normalize_embeddings(rows + rng.standard_normal(rows.shape, dtype=np.float32) * noise)
+    return np.vstack([real, synthetic]).astype(np.float32)
+
+
+def measure_backend(backend, embeddings, queries, top_k, params, reference):
+    """Buduje indeks i mierzy zapytania pojedyncze i wsadowe."""
+    start = time.perf_counter()
+    index = load_or_build_index(backend, embeddings, **params)
+    build = time.perf_counter() - start
+
+    single = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, top_k=top_k)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    found, _ = index.search_batch(queries, top_k=top_k)
+    batch = (time.perf_counter() - start) / len(queries)
+
+    single_ms = np.array(single) * 1000
+    return {
+        "backend": backend,
+        "build_s": build,
+        "memory_mb": index.memory_bytes() / 2**20,
+        "single_p50_ms": float(np.percentile(single_ms, 50)),
+        "single_p95_ms": float(np.percentile(single_ms, 95)),
+        "batch_ms_per_query": batch * 1000,
+        "recall": recall_at_k(reference, found) if reference is not None else 1.0,
+    }, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark skalowania wyszukiwania")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Rozmiary baz (lista)")
+    parser.add_argument("--backends", default=",".join(INDEX_BACKENDS), help="Backendy (lista)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="Liczba zapytań syntetycznych")
+    parser.add_argument("--encode-pool", type=int, default=5000, help="Maks. liczba faktów kodowanych modelem")
+    parser.add_argument("--noise", type=float, default=0.05, help="Szum wektorów syntetycznych faktów")
+    parser.add_argument("--query-noise", type=float, default=0.08, help="Szum zapytań syntetycznych")
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--json", help="Zapisz wyniki do pliku JSON")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = [backend.strip() for backend in args.backends.split(",")]
+    params = {"n_probe": args.n_probe, "rescore_factor": args.rescore_factor}
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    # pula faktów kodowanych modelem - wspólna dla wszystkich rozmiarów
+    pool_size = min(max(sizes), args.encode_pool)
+    facts = synthetic_facts(pool_size)
+    start = time.perf_counter()
+    pool = normalize_embeddings(model.encode(facts))
+    encode_rate = pool_size / (time.perf_counter() - start)
+    print(f"Kodowanie: {pool_size} faktów, {encode_rate:.0f} faktów/s, wymiar {pool.shape[1]}\n")
+    real_queries = normalize_embeddings(model.encode(TEST_QUERIES))
+
+    results = []
+    for size in sizes:
+        embeddings = expand_embeddings(pool, size, args.noise)
+        queries = make_queries(real_queries, embeddings, args.queries, args.query_noise)
+        encode_s = size / encode_rate
+        note = "" if size <= pool_size else " (ekstrapolowane)"
+        print(f"=== {size:,} faktów: kodowanie {encode_s:.1f} s{note}, {len(queries)} zapytań, top_k={args.top_k}")
+        print(f"{'backend':<9} {'budowa [s]':>10} {'pamięć [MB]':>12} {'p50 [ms]':>9} {'p95 [ms]':>9} "
+              f"{'wsad [ms/q]':>12} {'recall@' + str(args.top_k):>9}")
+
+        # wynik dokładny - punkt odniesienia dla recall
+        reference, _ = DenseRetriever(embeddings, normalized=True).search_batch(queries, top_k=args.top_k)
+
+        for backend in backends:
+            row, _ = measure_backend(backend, embeddings, queries, args.top_k, params,
+                                     None if backend == "exact" else reference)
+            print(f"{backend:<9} {row['build_s']:>10.3f} {row['memory_mb']:>12.1f} {row['single_p50_ms']:>9.3f} "
+                  f"{row['single_p95_ms']:>9.3f} {row['batch_ms_per_query']:>12.4f} {row['recall']:>9.3f}")
+            results.append({"size": size, "encode_s": encode_s, "encode_extrapolated": size > pool_size, **row})
+        print()
+
+        del embeddings
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"top_k": args.top_k, "encode_rate": encode_rate, "params": params, "results": results},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Zapisano: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Indeks rzadki BM25 z prostą normalizacją języka polskiego.
+
+Normalizacja tekstu:
+- małe litery,
+- usunięcie polskich znaków (ą -> a, ł -> l, ...),
+- lekki stemming: odcięcie najczęstszych końcówek fleksyjnych
+  ("półki", "półkę", "półkach" -> "polk"),
+- pominięcie najczęstszych słów funkcyjnych.
+
+Indeks jest kluczowany ID faktów z KnowledgeBase i wspiera add / remove
+bez przebudowy. Wyniki BM25 można łączyć z wyszukiwaniem gęstym
+(reciprocal_rank_fusion / weighted_fusion).
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+DIACRITICS = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+# końcówki po usunięciu polskich znaków, od najdłuższych
+SUFFIXES = (
+    "aniu", "eniu", "anie", "enie", "ania", "enia", "owie",
+    "ami", "ach", "ego", "emu", "ymi", "imi", "ych", "ich",
+    "ac", "ec", "ic", "yc", "ow", "om", "ie", "ej", "ym", "im",
+    "a", "e", "i", "o", "u", "y",
+)
+MIN_STEM_LENGTH = 3
+
+STOPWORDS = {
+    "a", "aby", "ale", "bo", "by", "co", "czy", "dla", "do", "i", "ich", "jak", "jaka",
+    "jakie", "jaki", "jest", "juz", "ma", "macie", "mi", "mnie", "na", "nie", "o", "od",
+    "oraz", "po", "przez", "sie", "sa", "tak", "to", "w", "we", "z", "za", "ze",
+}
+
+
+def fold_diacritics(text):
+    """Zamienia polskie znaki na odpowiedniki ASCII (po zamianie na małe litery)."""
+    return text.lower().translate(DIACRITICS)
+
+
+def stem(token):
+    """Lekki stemming: odcina najdłuższą pasującą końcówkę (stem >= 3 znaki)."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """
+    Normalizuje tekst i dzieli go na termy BM25.
+
+    Returns:
+        list[str]: Termy (po folding, stemmingu i bez słów funkcyjnych)
+    """
+    tokens = re.findall(r"[a-z0-9]+", fold_diacritics(text))
+    return [stem(token) for token in tokens if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Odwrócony indeks BM25 kluczowany ID dokumentów (faktów).
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id, text):
+        """Dodaje (albo podmienia) dokument."""
+        terms = Counter(tokenize(text))
+
+        with self._lock:
+            if doc_id in self.doc_terms:
+                self.remove(doc_id)
+
+            self.doc_terms[doc_id] = terms
+            self.doc_lengths[doc_id] = sum(terms.values())
+            self.total_length += self.doc_lengths[doc_id]
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        """Usuwa dokument (brak dokumentu jest ignorowany)."""
+        with self._lock:
+            terms = self.doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            for term in terms:
+                docs = self.postings[term]
+                del docs[doc_id]
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query, top_k=5):
+        """
+        Wyszukuje dokumenty BM25.
+
+        Args:
+            query: Zapytanie (str) albo gotowa lista termów
+            top_k: Maksymalna liczba wyników (int)
+
+        Returns:
+            list: Pary (ID dokumentu, wynik BM25) malejąco; tylko dokumenty
+                  z co najmniej jednym termem zapytania
+        """
+        terms = tokenize(query) if isinstance(query, str) else query
+        scores = {}
+
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs
+
+            for term in set(terms):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    length = self.doc_lengths[doc_id]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def coverage(self, doc_id, query):
+        """Udział termów zapytania obecnych w dokumencie (0-1)."""
+        terms = set(tokenize(query) if isinstance(query, str) else query)
+        if not terms:
+            return 0.0
+
+        with self._lock:
+            doc = self.doc_terms.get(doc_id, {})
+            return sum(1 for term in terms if term in doc) / len(terms)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Łączy rankingi metodą Reciprocal Rank Fusion.
+
+    Args:
+        rankings: Lista rankingów - każdy to lista ID, od najlepszego
+        k: Stała wygładzająca RRF (int)
+
+    Returns:
+        list: ID posortowane malejąco po sumie 1 / (k + pozycja)
+    """
+    scores = {}
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def weighted_fusion(scored_lists, weights):
+    """
+    Łączy wyniki ważoną sumą znormalizowanych (min-max) wyników.
+
+    Args:
+        scored_lists: Lista list par (ID, wynik)
+        weights: Waga każdej listy (list[float])
+
+    Returns:
+        list: ID posortowane malejąco po ważonej sumie
+    """
+    scores = {}
+    for hits, weight in zip(scored_lists, weights):
+        if not hits:
+            continue
+        values = [score for _, score in hits]
+        low, high = min(values), max(values)
+        for doc_id, score in hits:
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight * normalized
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,64 @@
+"""
+Kalibracja lokalnej oceny ugruntowania (groundedness.py) względem walidatora LLM.
+
+Dane: plik JSONL z ocenami walidatora LLM, zbierany w trakcie działania bota
+(settings.validation_log, np. "validation_log.jsonl"; walidator "llm").
+
+Skrypt dopasowuje mapowanie wyniku lokalnego na skalę 0-10, zapisuje je
+do settings.groundedness_calibration i raportuje zgodność decyzji PASS/FAIL
+z walidatorem LLM. Po kalibracji ustaw settings.validator = "local".
+
+Uruchomienie (w katalogu Embedding):
+    python calibrate_groundedness.py
+    python calibrate_groundedness.py --log validation_log.jsonl --threshold 7
+"""
+
+import argparse
+import json
+import os
+
+from groundedness import GroundednessScorer
+from rag_engine import BASE_DIR, EMBEDDING_MODEL_NAME, PLANT_NAMES, get_config
+
+
+def load_records(path):
+    """Wczytuje zalogowane oceny (JSONL) - słowniki question, response, relevant_facts, score."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    settings = get_config()['settings']
+
+    parser = argparse.ArgumentParser(description="Kalibracja lokalnej oceny ugruntowania")
+    parser.add_argument("--log", default=settings.get('validation_log') or "validation_log.jsonl",
+                        help="Plik JSONL z ocenami walidatora LLM")
+    parser.add_argument("--output", default=settings.get('groundedness_calibration', 'groundedness_calibration.json'))
+    parser.add_argument("--threshold", type=int, default=settings['validation_threshold'])
+    args = parser.parse_args()
+
+    records = load_records(os.path.join(BASE_DIR, args.log))
+    if not records:
+        print(f"Brak danych w {args.log} - włącz settings.validation_log i zbierz oceny walidatora LLM.")
+        return
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    scorer = GroundednessScorer(model.encode, plant_names=PLANT_NAMES)
+    report = scorer.calibrate(records, threshold=args.threshold)
+
+    passed = sum(1 for r in records if r["score"] >= args.threshold)
+    print(f"Dane: {report['n']} ocen walidatora LLM ({passed} PASS, próg {args.threshold})\n")
+    print(f"Mapowanie: ocena = {report['slope']:.2f} * wynik_lokalny + {report['intercept']:.2f}")
+    print(f"Korelacja z LLM:           {report['correlation']:.3f}")
+    print(f"Średni błąd bezwzględny:   {report['mae']:.2f} pkt")
+    print(f"Zgodność PASS/FAIL:        {report['agreement']:.1%} (bez kalibracji: {report['before_agreement']:.1%})")
+
+    output = os.path.join(BASE_DIR, args.output)
+    scorer.save_calibration(output)
+    print(f"\nZapisano kalibrację: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Historia rozmowy z budżetem tokenów.
+
+Przycinanie po liczbie par (MAX_HISTORY_PAIRS) nie patrzy na długość
+wiadomości: dziesięć długich odpowiedzi potrafi przekroczyć kontekst
+modelu, a dziesięć krótkich marnuje miejsce. ConversationHistory liczy
+tokeny każdej wiadomości raz - przy dodaniu - i trzyma sumę, więc
+przycięcie do budżetu to zdejmowanie najstarszych wiadomości z początku
+kolejki (O(1) zamortyzowane na wiadomość, bez przebudowy listy).
+
+- prompty system / developer są przypięte (nie liczą się do przycinania),
+- przycinane są całe tury: po zdjęciu pytania zdejmowana jest też
+  osierocona odpowiedź,
+- ostatnia tura zostaje zawsze, nawet jeśli sama przekracza budżet.
+
+Tryb kompakcji: starsze tury można zastąpić jednym, kroczącym
+podsumowaniem (apply_summary). Podsumowanie stoi za przypiętymi promptami
+jako wiadomość "system" i - jak one - nie podlega przycinaniu. Kompakcja
+działa w tle, więc w międzyczasie mogą dojść nowe tury (albo budżet może
+zdjąć stare): wiadomości mają numery kolejne i podsumowanie zastępuje
+tylko te, które faktycznie streszczono. Podsumowanie ma limit tokenów
+(max_tokens w apply_summary), więc kroczące streszczenie nie rośnie
+z każdą kompakcją.
+"""
+
+from collections import deque
+
+PINNED_ROLES = ("system", "developer")
+
+SUMMARY_PREFIX = "Podsumowanie wcześniejszej rozmowy: "
+
+# narzut formatu czatu na wiadomość (rola, separatory)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Zgrubny szacunek liczby tokenów tekstu (~4 znaki na token)."""
+    return len(text) // 4
+
+
+class ConversationHistory:
+    """
+    Lista wiadomości rozmowy z zapamiętaną liczbą tokenów każdej wiadomości.
+
+    Zachowuje się jak lista wiadomości przy odczycie (iteracja, reversed,
+    len, indeksowanie), więc może zastąpić conversation_history.
+
+    Przykład:
+        history = ConversationHistory([system_prompt, developer_prompt])
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+        history.trim(budget=2000)
+        history.usage()      # {"tokens": ..., "budget": 2000, ...}
+    """
+
+    def __init__(self, messages=(), budget=None, count_tokens=estimate_tokens):
+        """
+        Args:
+            messages: Wiadomości początkowe (np. prompty systemowe)
+            budget: Budżet tokenów nieprzypiętych wiadomości (None = bez limitu)
+            count_tokens: Funkcja tekst -> liczba tokenów (np. tokenizer modelu)
+        """
+        self.budget = budget
+        self._count_tokens = count_tokens
+
+        self._pinned = []
+        self._pinned_tokens = 0
+        self._messages = deque()
+        self._tokens = deque()
+        self._total = 0
+        # numer kolejny pierwszej wiadomości w _messages i granica ostatniego clear()
+        self._first_seq = 0
+        self._cleared_seq = 0
+
+        self.summary = None
+        self._summary_message = None
+        self.summary_tokens = 0
+        self.compacted_messages = 0
+        self.summary_truncations = 0
+        # zadanie kompakcji w tle (trzymane tutaj, żeby nie zostało zebrane przez GC)
+        self.compaction_task = None
+
+        self.trimmed_messages = 0
+        self.trimmed_tokens = 0
+
+        for message in messages:
+            self.append(message)
+
+    def _head(self):
+        """Przypięte prompty + podsumowanie (jeśli jest)."""
+        if self._summary_message is None:
+            return self._pinned
+        return self._pinned + [self._summary_message]
+
+    def __len__(self):
+        return len(self._head()) + len(self._messages)
+
+    def __iter__(self):
+        yield from self._head()
+        yield from self._messages
+
+    def __reversed__(self):
+        yield from reversed(self._messages)
+        yield from reversed(self._head())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        head = self._head()
+        if index < 0:
+            index += len(self)
+        if 0 <= index < len(head):
+            return head[index]
+        if 0 <= index < len(self):
+            return self._messages[index - len(head)]
+        raise IndexError("indeks historii poza zakresem")
+
+    def __repr__(self):
+        return f"ConversationHistory({len(self)} wiadomości, {self.tokens} tokenów, budżet {self.budget})"
+
+    def message_tokens(self, message):
+        """Liczba tokenów wiadomości (treść + narzut formatu)."""
+        return self._count_tokens(str(message.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS
+
+    @property
+    def tokens(self):
+        """Tokeny nieprzypiętych wiadomości (to one podlegają budżetowi)."""
+        return self._total
+
+    @property
+    def pinned_tokens(self):
+        return self._pinned_tokens
+
+    @property
+    def message_count(self):
+        """Liczba nieprzypiętych wiadomości (bez promptów i podsumowania)."""
+        return len(self._messages)
+
+    def append(self, message):
+        """Dodaje wiadomość; liczba tokenów liczona jest tylko tutaj."""
+        tokens = self.message_tokens(message)
+        if message["role"] in PINNED_ROLES:
+            self._pinned.append(message)
+            self._pinned_tokens += tokens
+            return
+        self._messages.append(message)
+        self._tokens.append(tokens)
+        self._total += tokens
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        """Usuwa rozmowę i podsumowanie, zostawia przypięte prompty."""
+        self._first_seq += len(self._messages)
+        self._cleared_seq = self._first_seq
+        self._messages.clear()
+        self._tokens.clear()
+        self._total = 0
+        self.summary = None
+        self._summary_message = None
+        self.summary_tokens = 0
+
+    def _pop_oldest(self):
+        self._messages.popleft()
+        tokens = self._tokens.popleft()
+        self._total -= tokens
+        self._first_seq += 1
+        return tokens
+
+    def _pop_trimmed(self):
+        self.trimmed_tokens += self._pop_oldest()
+        self.trimmed_messages += 1
+
+    def trim(self, budget=None):
+        """
+        Zdejmuje najstarsze tury, aż suma tokenów zmieści się w budżecie.
+
+        Args:
+            budget: Nowy budżet (None = dotychczasowy self.budget)
+
+        Returns:
+            int: Liczba usuniętych wiadomości
+        """
+        if budget is not None:
+            self.budget = budget
+        if self.budget is None:
+            return 0
+
+        before = self.trimmed_messages
+        # ostatnia tura (pytanie + odpowiedź) zostaje zawsze
+        while self._total > self.budget and len(self._messages) > 2:
+            self._pop_trimmed()
+            # bez osieroconych odpowiedzi na początku rozmowy
+            while len(self._messages) > 2 and self._messages[0]["role"] != "user":
+                self._pop_trimmed()
+        return self.trimmed_messages - before
+
+    def compaction_candidates(self, keep_messages):
+        """
+        Wiadomości do streszczenia: wszystko poza ostatnimi keep_messages
+        (granica przesuwana tak, żeby zachowana część zaczynała się od pytania).
+
+        Returns:
+            tuple: (lista wiadomości, numer kolejny pierwszej niestreszczonej) albo None
+        """
+        cut = len(self._messages) - keep_messages
+        while 0 < cut < len(self._messages) and self._messages[cut]["role"] != "user":
+            cut -= 1
+        if cut <= 0:
+            return None
+        return [self._messages[i] for i in range(cut)], self._first_seq + cut
+
+    def _fit_summary(self, summary, max_tokens):
+        """Najdłuższy początek podsumowania (całe słowa) mieszczący się w max_tokens."""
+        if max_tokens is None or self._count_tokens(summary) <= max_tokens:
+            return summary
+        words = summary.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._count_tokens(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        self.summary_truncations += 1
+        return " ".join(words[:low])
+
+    def apply_summary(self, summary, upto_seq, max_tokens=None):
+        """
+        Zastępuje wiadomości o numerach < upto_seq podsumowaniem.
+
+        Args:
+            summary: Nowe, kroczące podsumowanie (obejmuje też poprzednie)
+            upto_seq: Numer z compaction_candidates()
+            max_tokens: Limit tokenów treści podsumowania (dłuższe jest obcinane
+                        do pełnych słów; None = bez limitu)
+
+        Returns:
+            int: Liczba zastąpionych wiadomości (część mogła już zdjąć trim())
+        """
+        # rozmowę wyczyszczono w trakcie streszczania - podsumowanie nieaktualne
+        if upto_seq <= self._cleared_seq:
+            return 0
+
+        compacted = 0
+        while self._messages and self._first_seq < upto_seq:
+            self._pop_oldest()
+            compacted += 1
+        self.compacted_messages += compacted
+
+        self.summary = summary = self._fit_summary(summary, max_tokens)
+        self._summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+        self.summary_tokens = self.message_tokens(self._summary_message)
+        return compacted
+
+    def usage(self):
+        """
+        Wykorzystanie budżetu.
+
+        Returns:
+            dict: tokens, budget, utilization, pinned_tokens, summary_tokens, messages,
+                  trimmed_messages, trimmed_tokens, compacted_messages, summary_truncations
+        """
+        return {
+            "tokens": self._total,
+            "budget": self.budget,
+            "utilization": self._total / self.budget if self.budget else None,
+            "pinned_tokens": self._pinned_tokens,
+            "summary_tokens": self.summary_tokens,
+            "messages": len(self._messages),
+            "trimmed_messages": self.trimmed_messages,
+            "trimmed_tokens": self.trimmed_tokens,
+            "compacted_messages": self.compacted_messages,
+            "summary_truncations": self.summary_truncations,
+        }
+
+
+def build_summary_prompt(previous_summary, messages):
+    """
+    Buduje prompt streszczający (poprzednie podsumowanie + nowe wiadomości).
+    """
+    speakers = {"user": "Klient", "assistant": "Asystent"}
+    transcript = "\n".join(f"{speakers.get(msg['role'], msg['role'])}: {msg['content']}" for msg in messages)
+
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Streszczasz rozmowę klienta z asystentem sklepu botanicznego 'Zielony Doom'. "
+                "Zachowaj to, co ważne dla dalszej rozmowy: o jakie rośliny i produkty pytał klient, "
+                "jego warunki (np. światło, doświadczenie), ustalenia i otwarte sprawy. "
+                "Pisz po polsku, zwięźle, najwyżej 5 zdań, bez powitań."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Dotychczasowe podsumowanie:\n{previous_summary or '(brak)'}\n\n"
+                f"Nowe wiadomości:\n{transcript}\n\n"
+                f"Zaktualizowane podsumowanie:"
+            )
+        }
+    ]
+
+
+async def compact_history(history, keep_messages, summarize, max_tokens=None):
+    """
+    Streszcza wszystkie tury historii poza ostatnimi keep_messages wiadomościami.
+
+    Args:
+        history: ConversationHistory
+        keep_messages: Liczba ostatnich wiadomości zostawianych bez zmian
+        summarize: Korutyna prompt -> tekst podsumowania (wywołanie modelu)
+        max_tokens: Limit tokenów podsumowania (apply_summary)
+
+    Returns:
+        int lub None: Liczba zastąpionych wiadomości; None = nie było czego streszczać
+    """
+    candidates = history.compaction_candidates(keep_messages)
+    if candidates is None:
+        return None
+    messages, upto_seq = candidates
+    summary = await summarize(build_summary_prompt(history.summary, messages))
+    return history.apply_summary(summary, upto_seq, max_tokens)
@@ -0,0 +1,146 @@
+"""
+Trwały magazyn embeddingów bazy wiedzy (memory-mapped).
+
+Na dysku:
+- embeddings.npy  - macierz float32 (n_facts, dim), znormalizowana, w kolejności faktów
+- manifest.json   - nazwa modelu, wymiar i lista hashy faktów (hash wiersza = hash treści)
+
+Przy starcie sync() porównuje hashe aktualnej bazy wiedzy z manifestem
+i koduje modelem TYLKO nowe lub zmienione fakty. Jeśli nic się nie zmieniło,
+macierz jest po prostu otwierana przez np.memmap (bez kopiowania do RAM).
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from retrieval import normalize_embeddings
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def fact_hash(fact):
+    """Zwraca hash treści faktu (sha256, hex)."""
+    return hashlib.sha256(fact.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Magazyn embeddingów na dysku, kluczowany hashem faktu i nazwą modelu.
+
+    Zmiana modelu (model_name) unieważnia cały magazyn.
+    """
+
+    def __init__(self, directory, model_name):
+        self.directory = directory
+        self.model_name = model_name
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+        self.embeddings = None
+        self.fingerprint = None
+        self.last_encoded = 0
+
+    def _load_manifest(self):
+        """Wczytuje manifest; zwraca None, jeśli go nie ma lub nie pasuje do modelu."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if manifest.get("model_name") != self.model_name:
+            return None
+        return manifest
+
+    def _open_embeddings(self, manifest):
+        """Otwiera plik embeddingów jako np.memmap (tylko odczyt) i sprawdza kształt."""
+        try:
+            embeddings = np.load(self.embeddings_path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+
+        expected_shape = (len(manifest["hashes"]), manifest["dim"])
+        if embeddings.dtype != np.float32 or embeddings.shape != expected_shape:
+            return None
+        return embeddings
+
+    def sync(self, facts, encode):
+        """
+        Zwraca embeddingi dla facts, kodując tylko nowe/zmienione fakty.
+
+        Args:
+            facts: Lista faktów (list[str])
+            encode: Funkcja kodująca listę tekstów, np. embedding_model.encode
+
+        Returns:
+            np.memmap: Znormalizowana macierz float32 (len(facts), dim)
+        """
+        hashes = [fact_hash(fact) for fact in facts]
+
+        # identyfikator zawartości magazynu - m.in. do unieważniania indeksów ANN
+        self.fingerprint = fact_hash(self.model_name + "\n" + "".join(hashes))
+
+        manifest = self._load_manifest()
+        old_embeddings = self._open_embeddings(manifest) if manifest else None
+        if old_embeddings is None:
+            manifest = None
+
+        # bez zmian - sam memmap, nic nie kodujemy
+        if manifest is not None and manifest["hashes"] == hashes:
+            self.embeddings = old_embeddings
+            self.last_encoded = 0
+            return self.embeddings
+
+        old_rows = {}
+        if manifest is not None:
+            old_rows = {h: row for row, h in enumerate(manifest["hashes"])}
+
+        missing = [i for i, h in enumerate(hashes) if h not in old_rows]
+        new_embeddings = None
+        if missing:
+            new_embeddings = normalize_embeddings(encode([facts[i] for i in missing]))
+
+        if new_embeddings is not None:
+            dim = new_embeddings.shape[1]
+        elif old_embeddings is not None:
+            dim = old_embeddings.shape[1]
+        else:
+            dim = 0
+
+        # nowa macierz w kolejności faktów: stare wiersze z memmapa + nowo zakodowane
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_embeddings_path = self.embeddings_path + ".tmp"
+        matrix = np.lib.format.open_memmap(
+            tmp_embeddings_path, mode="w+", dtype=np.float32, shape=(len(facts), dim)
+        )
+
+        new_position = {i: pos for pos, i in enumerate(missing)}
+        for i, h in enumerate(hashes):
+            if i in new_position:
+                matrix[i] = new_embeddings[new_position[i]]
+            else:
+                matrix[i] = old_embeddings[old_rows[h]]
+        matrix.flush()
+        del matrix
+
+        # zwalniamy stary memmap przed podmianą pliku (wymagane m.in. na Windows)
+        old_embeddings = None
+        self.embeddings = None
+
+        tmp_manifest_path = self.manifest_path + ".tmp"
+        with open(tmp_manifest_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"model_name": self.model_name, "dim": dim, "hashes": hashes},
+                f,
+                indent=2,
+            )
+
+        os.replace(tmp_embeddings_path, self.embeddings_path)
+        os.replace(tmp_manifest_path, self.manifest_path)
+
+        self.embeddings = np.load(self.embeddings_path, mmap_mode="r")
+        self.last_encoded = len(missing)
+        return self.embeddings
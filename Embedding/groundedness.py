@@ -0,0 +1,179 @@
+"""
+Lokalna ocena ugruntowania odpowiedzi (alternatywa dla walidatora LLM).
+
+Ocena 0-10 liczona bez wywołania modelu językowego:
+- semantyka: każde zdanie odpowiedzi porównywane jest (embeddingi, cosine
+  similarity) z faktami z retrievalu; liczy się średnie najlepsze dopasowanie,
+  przeskalowane liniowo z [sim_low, sim_high] do [0, 1],
+- liczby: udział liczb z odpowiedzi (ceny, dni, centymetry...) obecnych w faktach,
+- nazwy roślin: udział nazw roślin z odpowiedzi obecnych w faktach
+  (porównanie po normalizacji i stemmingu z bm25, więc "monsterę" = "Monstera").
+
+Wynik surowy (0-1) to ważona suma trzech składowych. Mapowanie na skalę
+walidatora LLM (0-10) kalibruje calibrate() na zalogowanych ocenach LLM.
+"""
+
+import json
+import re
+
+import numpy as np
+
+from bm25 import tokenize
+from retrieval import normalize_embeddings
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+
+DEFAULT_WEIGHTS = {"semantic": 0.6, "numbers": 0.25, "names": 0.15}
+
+
+def split_sentences(text):
+    """Dzieli tekst na zdania (po . ! ? i nowych liniach), pomija puste i punktory."""
+    sentences = (sentence.strip(" -•*\t") for sentence in SENTENCE_PATTERN.split(text))
+    return [sentence for sentence in sentences if len(sentence) > 1]
+
+
+def extract_numbers(text):
+    """Zbiór liczb w tekście ("2-3 cm" -> {"2", "3"}, "5°C" -> {"5"}), przecinek = kropka."""
+    return {number.replace(",", ".") for number in NUMBER_PATTERN.findall(text)}
+
+
+class GroundednessScorer:
+    """
+    Ocena ugruntowania odpowiedzi w faktach, w skali walidatora LLM (0-10).
+
+    Przykład:
+        scorer = GroundednessScorer(embedding_model.encode, plant_names=PLANT_NAMES)
+        score = scorer.score(response, relevant_facts)
+    """
+
+    def __init__(self, encode, plant_names=(), weights=None, sim_low=0.3, sim_high=0.8,
+                 calibration=None):
+        """
+        Args:
+            encode: Funkcja kodująca listę tekstów, np. embedding_model.encode
+            plant_names: Słownik nazw roślin sprawdzanych leksykalnie
+            weights: Wagi składowych (semantic, numbers, names) - brakujące z DEFAULT_WEIGHTS
+            sim_low, sim_high: Podobieństwo zdania do faktu odpowiadające 0 i 1
+            calibration: Parametry (slope, intercept) mapowania wyniku surowego na 0-10;
+                         None = wynik surowy * 10
+        """
+        self.encode = encode
+        # tokenize() już stemuje - nazwy przechodzą dokładnie tę samą drogę co odpowiedź
+        self.plant_stems = {token for name in plant_names for token in tokenize(name)}
+        for name in plant_names:
+            if not set(tokenize(f"Polecam {name}.")) & self.plant_stems:
+                raise ValueError(f"Nazwa rośliny {name!r} nie rozpoznaje samej siebie w odpowiedzi")
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.sim_low = sim_low
+        self.sim_high = sim_high
+        self.calibration = calibration
+
+    def components(self, response, relevant_facts):
+        """
+        Składowe oceny, każda w [0, 1].
+
+        Returns:
+            dict: semantic, numbers, names, raw (ważona suma)
+        """
+        sentences = split_sentences(response)
+        facts = list(relevant_facts)
+
+        if sentences and facts:
+            embeddings = normalize_embeddings(np.atleast_2d(self.encode(sentences + facts)))
+            similarity = embeddings[:len(sentences)] @ embeddings[len(sentences):].T
+            best = similarity.max(axis=1).mean()
+            semantic = float(np.clip((best - self.sim_low) / (self.sim_high - self.sim_low), 0.0, 1.0))
+        else:
+            semantic = 0.0
+
+        fact_text = " ".join(facts)
+
+        response_numbers = extract_numbers(response)
+        if response_numbers:
+            numbers = len(response_numbers & extract_numbers(fact_text)) / len(response_numbers)
+        else:
+            numbers = 1.0
+
+        response_names = set(tokenize(response)) & self.plant_stems
+        if response_names:
+            names = len(response_names & set(tokenize(fact_text))) / len(response_names)
+        else:
+            names = 1.0
+
+        raw = (
+            self.weights["semantic"] * semantic
+            + self.weights["numbers"] * numbers
+            + self.weights["names"] * names
+        ) / sum(self.weights.values())
+
+        return {"semantic": semantic, "numbers": numbers, "names": names, "raw": raw}
+
+    def score_raw(self, raw):
+        """Mapuje wynik surowy (0-1) na ocenę 0-10 (z kalibracją, jeśli jest)."""
+        if self.calibration is None:
+            value = raw * 10
+        else:
+            value = self.calibration["slope"] * raw + self.calibration["intercept"]
+        return int(round(min(10.0, max(0.0, value))))
+
+    def score(self, response, relevant_facts):
+        """
+        Ocena ugruntowania odpowiedzi.
+
+        Returns:
+            int: Ocena 0-10 (jak validate_response)
+        """
+        return self.score_raw(self.components(response, relevant_facts)["raw"])
+
+    def calibrate(self, records, threshold=7):
+        """
+        Dopasowuje mapowanie wyniku surowego do ocen walidatora LLM (regresja liniowa).
+
+        Args:
+            records: Lista słowników z kluczami response, relevant_facts, score (ocena LLM)
+            threshold: Próg PASS do raportu zgodności
+
+        Returns:
+            dict: slope, intercept oraz raport: n, mae, correlation, agreement
+                  (zgodność decyzji PASS/FAIL z LLM), before_agreement (przy poprzednim mapowaniu)
+        """
+        raw = np.array([self.components(r["response"], r["relevant_facts"])["raw"] for r in records])
+        llm = np.array([r["score"] for r in records], dtype=float)
+
+        # oceny przy dotychczasowym mapowaniu - do porównania
+        before = np.array([self.score_raw(value) for value in raw])
+
+        # regresja ma sens tylko, gdy obie strony się zmieniają - inaczej mapowanie domyślne
+        informative = len(records) >= 2 and raw.std() > 0 and llm.std() > 0
+        if informative:
+            slope, intercept = np.polyfit(raw, llm, 1)
+        else:
+            slope, intercept = 10.0, 0.0
+        self.calibration = {"slope": float(slope), "intercept": float(intercept)}
+
+        local = np.array([self.score_raw(value) for value in raw])
+        correlation = float(np.corrcoef(raw, llm)[0, 1]) if informative else 0.0
+
+        return {
+            **self.calibration,
+            "n": len(records),
+            "mae": float(np.abs(local - llm).mean()) if len(records) else 0.0,
+            "correlation": correlation,
+            "agreement": float(((local >= threshold) == (llm >= threshold)).mean()) if len(records) else 0.0,
+            "before_agreement": float(((before >= threshold) == (llm >= threshold)).mean()) if len(records) else 0.0,
+        }
+
+    def save_calibration(self, path):
+        """Zapisuje parametry kalibracji do pliku json."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.calibration, f, indent=2)
+
+    @staticmethod
+    def load_calibration(path):
+        """Wczytuje parametry kalibracji (None, jeśli pliku nie ma)."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
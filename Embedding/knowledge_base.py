@@ -0,0 +1,318 @@
+"""
+Baza wiedzy z przyrostowymi zmianami (add / update / remove).
+
+Zamiast przeliczać embeddingi całej listy faktów po każdej zmianie:
+- add / update kodują modelem TYLKO nowe treści i dopisują wiersze na końcu macierzy,
+- remove (i stara wersja przy update) zostawia "nagrobek" (tombstone) - wiersz
+  jest pomijany w wynikach, ale fizycznie zostaje w macierzy,
+- co jakiś czas compact() usuwa nagrobki i przebudowuje indeks wyszukiwania.
+
+Słuchacze (add_listener) dostają ID faktów zmienionych przez add / update / remove,
+np. żeby unieważnić zależne od nich odpowiedzi w cache.
+
+Wiersze dopisane od ostatniej kompakcji (delta) przeszukiwane są dokładnie,
+więc indeks (także ANN) nie musi wspierać wstawiania. Zapytania są obsługiwane
+przez cały czas - kodowanie i przebudowa indeksu odbywają się poza blokadą odczytu.
+"""
+
+import threading
+
+import numpy as np
+
+from retrieval import DenseRetriever, normalize_embeddings, top_k_from_scores
+
+
+class KnowledgeBase:
+    """
+    Baza faktów z embeddingami i indeksem wyszukiwania.
+
+    Każdy fakt ma stałe ID (int), niezmienne przy update i kompakcji.
+    """
+
+    def __init__(self, facts, encode, embeddings=None, index=None, index_factory=None,
+                 compact_ratio=0.25, sparse_index=None):
+        """
+        Args:
+            facts: Początkowa lista faktów (list[str])
+            encode: Funkcja kodująca listę tekstów, np. embedding_model.encode
+            embeddings: Gotowe, znormalizowane embeddingi facts (np. z EmbeddingStore) - None = zakoduj
+            index: Gotowy indeks dla embeddings - None = zbuduj przez index_factory
+            index_factory: Funkcja (znormalizowane embeddingi) -> indeks z search_batch();
+                           domyślnie dokładny DenseRetriever
+            compact_ratio: Udział nagrobków / nowych wierszy, po którym robimy kompakcję
+            sparse_index: Opcjonalny indeks rzadki (BM25Index) utrzymywany razem z bazą
+        """
+        self.encode = encode
+        self.index_factory = index_factory or (lambda matrix: DenseRetriever(matrix, normalized=True))
+        self.compact_ratio = compact_ratio
+
+        # _lock chroni spójny odczyt struktur; _write_lock serializuje zmiany
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+
+        facts = list(facts)
+        if embeddings is None:
+            embeddings = self._encode(facts)
+
+        self.matrix = embeddings
+        self.size = len(facts)
+        self.indexed_count = self.size
+        self.index = index if index is not None else self.index_factory(self.matrix)
+
+        self.texts = list(facts)
+        self.alive = np.ones(self.size, dtype=bool)
+        self.slot_ids = np.arange(self.size, dtype=np.int64)
+        self.id_to_slot = {i: i for i in range(self.size)}
+        self.next_id = self.size
+        self.tombstones = 0
+        self.compactions = 0
+
+        self._listeners = []
+
+        self.sparse_index = sparse_index
+        if sparse_index is not None:
+            for fact_id, fact in enumerate(facts):
+                sparse_index.add(fact_id, fact)
+
+    def _encode(self, facts):
+        """Koduje fakty i normalizuje embeddingi (float32)."""
+        return normalize_embeddings(np.atleast_2d(self.encode(list(facts))))
+
+    def __len__(self):
+        return len(self.id_to_slot)
+
+    def facts(self):
+        """Zwraca aktualne (żywe) fakty w kolejności wierszy macierzy."""
+        with self._lock:
+            return [self.texts[slot] for slot in sorted(self.id_to_slot.values())]
+
+    def find(self, fact):
+        """Zwraca ID faktu o dokładnie takiej treści albo None."""
+        with self._lock:
+            for fact_id, slot in self.id_to_slot.items():
+                if self.texts[slot] == fact:
+                    return fact_id
+        return None
+
+    def get(self, fact_id):
+        """Zwraca treść faktu o podanym ID (KeyError, jeśli usunięty)."""
+        with self._lock:
+            return self.texts[self.id_to_slot[fact_id]]
+
+    def get_many(self, fact_ids):
+        """Zwraca treści faktów o podanych ID, pomijając usunięte."""
+        with self._lock:
+            return [self.texts[self.id_to_slot[i]] for i in fact_ids if i in self.id_to_slot]
+
+    # --- zmiany ---
+
+    def add_listener(self, callback):
+        """
+        Rejestruje funkcję callback(fact_ids, added) wywoływaną po zmianie bazy:
+        added=True po add / add_many, False po update / remove.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, fact_ids, added=False):
+        for callback in self._listeners:
+            callback(fact_ids, added=added)
+
+    def _append(self, embeddings, texts, fact_ids, retire_slots=()):
+        """
+        Dopisuje wiersze na końcu macierzy (powiększając ją w razie potrzeby).
+
+        retire_slots dostają nagrobek w tej samej chwili, w której nowe wiersze
+        stają się widoczne - zapytanie nigdy nie zobaczy obu wersji faktu.
+        """
+        needed = self.size + len(texts)
+
+        matrix = self.matrix
+        alive = self.alive
+        slot_ids = self.slot_ids
+
+        # brak miejsca (albo macierz tylko do odczytu, np. memmap) - nowa, 2x większa tablica
+        if needed > matrix.shape[0] or not matrix.flags.writeable:
+            capacity = max(needed, 2 * matrix.shape[0], 16)
+            matrix = np.empty((capacity, embeddings.shape[1]), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            slot_ids = np.full(capacity, -1, dtype=np.int64)
+            slot_ids[:self.size] = self.slot_ids[:self.size]
+
+        # wiersze za self.size nie są widoczne dla zapytań, więc zapis jest bezpieczny
+        matrix[self.size:needed] = embeddings
+        alive[self.size:needed] = True
+        slot_ids[self.size:needed] = fact_ids
+
+        with self._lock:
+            self.matrix = matrix
+            self.alive = alive
+            self.slot_ids = slot_ids
+            for slot in retire_slots:
+                self.alive[slot] = False
+                self.tombstones += 1
+            for offset, (text, fact_id) in enumerate(zip(texts, fact_ids)):
+                self.texts.append(text)
+                self.id_to_slot[fact_id] = self.size + offset
+            self.size = needed
+
+    def add(self, fact):
+        """Dodaje fakt; zwraca jego ID."""
+        return self.add_many([fact])[0]
+
+    def add_many(self, facts):
+        """
+        Dodaje wiele faktów jednym wywołaniem modelu.
+
+        Returns:
+            list[int]: ID dodanych faktów
+        """
+        facts = list(facts)
+        if not facts:
+            return []
+
+        embeddings = self._encode(facts)
+
+        with self._write_lock:
+            fact_ids = list(range(self.next_id, self.next_id + len(facts)))
+            self.next_id += len(facts)
+            self._append(embeddings, facts, fact_ids)
+            if self.sparse_index is not None:
+                for fact_id, fact in zip(fact_ids, facts):
+                    self.sparse_index.add(fact_id, fact)
+
+        self._notify(fact_ids, added=True)
+        self._maybe_compact()
+        return fact_ids
+
+    def update(self, fact_id, fact):
+        """
+        Zmienia treść faktu (koduje tylko nową treść, ID pozostaje bez zmian).
+        """
+        embeddings = self._encode([fact])
+
+        with self._write_lock:
+            if fact_id not in self.id_to_slot:
+                raise KeyError(f"Brak faktu o ID {fact_id}")
+
+            # nowa wersja dopisana na końcu, stara dostaje nagrobek
+            self._append(embeddings, [fact], [fact_id], retire_slots=[self.id_to_slot[fact_id]])
+            if self.sparse_index is not None:
+                self.sparse_index.add(fact_id, fact)
+
+        self._notify([fact_id])
+        self._maybe_compact()
+
+    def remove(self, fact_id):
+        """Usuwa fakt (nagrobek; fizycznie znika przy kompakcji)."""
+        with self._write_lock:
+            with self._lock:
+                if fact_id not in self.id_to_slot:
+                    raise KeyError(f"Brak faktu o ID {fact_id}")
+                self.alive[self.id_to_slot.pop(fact_id)] = False
+                self.tombstones += 1
+            if self.sparse_index is not None:
+                self.sparse_index.remove(fact_id)
+
+        self._notify([fact_id])
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """Kompakcja, gdy nagrobków lub nieindeksowanych wierszy jest za dużo."""
+        threshold = self.compact_ratio * max(self.indexed_count, 1)
+        delta = self.size - self.indexed_count
+        if self.tombstones > threshold or delta > threshold:
+            self.compact()
+
+    def compact(self):
+        """
+        Usuwa nagrobki i przebudowuje indeks na wszystkich żywych wierszach.
+
+        Indeks budowany jest poza _lock - zapytania działają na starej wersji
+        aż do podmiany.
+        """
+        with self._write_lock:
+            with self._lock:
+                slots = np.flatnonzero(self.alive[:self.size])
+                matrix = np.ascontiguousarray(self.matrix[slots])
+                slot_ids = self.slot_ids[slots].copy()
+                texts = [self.texts[slot] for slot in slots]
+
+            index = self.index_factory(matrix)
+
+            with self._lock:
+                self.matrix = matrix
+                self.index = index
+                self.size = self.indexed_count = len(slots)
+                self.texts = texts
+                self.alive = np.ones(len(slots), dtype=bool)
+                self.slot_ids = slot_ids
+                self.id_to_slot = {int(fact_id): slot for slot, fact_id in enumerate(slot_ids)}
+                self.tombstones = 0
+                self.compactions += 1
+
+    # --- wyszukiwanie ---
+
+    def search_batch(self, query_embeddings, top_k=5):
+        """
+        Wyszukuje top-k żywych faktów dla wielu zapytań.
+
+        Args:
+            query_embeddings: Embeddingi zapytań (n_queries, dim)
+            top_k: Liczba zwracanych faktów na zapytanie (int)
+
+        Returns:
+            list: Dla każdego zapytania lista par (ID faktu, podobieństwo), malejąco
+        """
+        queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+
+        with self._lock:
+            # nadmiarowe pobranie z indeksu, żeby nagrobki nie zjadły wyników
+            fetch = min(top_k + self.tombstones, self.indexed_count)
+            if fetch > 0:
+                index_rows, index_scores = self.index.search_batch(queries, top_k=fetch)
+            else:
+                index_rows = np.empty((len(queries), 0), dtype=np.int64)
+                index_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+            # wiersze dopisane po ostatniej kompakcji - przeszukiwane dokładnie
+            delta_rows = np.arange(self.indexed_count, self.size)
+            delta_rows = delta_rows[self.alive[delta_rows]]
+            delta_scores = queries @ self.matrix[delta_rows].T
+
+            results = []
+            for row in range(len(queries)):
+                keep = self.alive[index_rows[row]]
+                rows = np.concatenate([index_rows[row][keep], delta_rows])
+                scores = np.concatenate([index_scores[row][keep], delta_scores[row]])
+
+                best, best_scores = top_k_from_scores(scores[np.newaxis, :], top_k)
+                results.append([
+                    (int(self.slot_ids[rows[i]]), float(score))
+                    for i, score in zip(best[0], best_scores[0])
+                ])
+            return results
+
+    def similarities(self, query_embedding, fact_ids):
+        """Dokładne podobieństwo kosinusowe zapytania do faktów o podanych ID (0.0 dla usuniętych)."""
+        query = normalize_embeddings(np.atleast_2d(query_embedding))[0]
+        with self._lock:
+            return [float(self.matrix[self.id_to_slot[fact_id]] @ query) if fact_id in self.id_to_slot else 0.0
+                    for fact_id in fact_ids]
+
+    def search(self, query_embedding, top_k=5):
+        """Wyszukuje top-k żywych faktów dla jednego zapytania: lista (ID, podobieństwo)."""
+        return self.search_batch(np.atleast_2d(query_embedding), top_k)[0]
+
+    def search_facts_batch(self, query_embeddings, top_k=5):
+        """Jak search_batch, ale zwraca treści faktów (spójne z chwilą wyszukiwania)."""
+        with self._lock:
+            return [
+                [self.texts[self.id_to_slot[fact_id]] for fact_id, _ in hits]
+                for hits in self.search_batch(query_embeddings, top_k)
+            ]
+
+    def search_facts(self, query_embedding, top_k=5):
+        """Jak search, ale zwraca listę treści faktów."""
+        return self.search_facts_batch(np.atleast_2d(query_embedding), top_k)[0]
@@ -0,0 +1,396 @@
+"""
+Klienci LLM (AsyncOpenAI) dla rag_engine.
+
+- ClientRegistry: jeden klient AsyncOpenAI na endpoint (i pętlę asyncio)
+  z własną, ograniczoną pulą połączeń HTTP (keep-alive, httpx), timeoutami
+  z konfiguracji i statystykami ponownego użycia połączeń, oraz limit
+  równoległych zapytań do każdego endpointu (asyncio.Semaphore).
+- Pula endpointów na api_type: zapytanie trafia do zdrowego endpointu
+  z najmniejszą liczbą trwających zapytań; endpoint po kilku błędach
+  z rzędu jest pomijany przez czas cooldown. Rejestr zbiera też czasy
+  odpowiedzi (okno ostatnich zapytań per model) - ich kwantyl wyznacza
+  termin, po którym warto wysłać zapytanie zapasowe (hedging).
+- run_sync(): uruchamia korutynę na wspólnej pętli w wątku w tle, dzięki
+  czemu synchroniczne API (ask_bot, call_model, ...) działa także tam, gdzie
+  pętla już działa (Jupyter) i z wielu wątków naraz.
+- iterate_sync(): to samo dla asynchronicznych iteratorów (streaming tokenów).
+"""
+
+import asyncio
+import math
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+
+# domyślne ustawienia puli połączeń (settings.http_pool) i timeoutów w sekundach (settings.http_timeouts)
+DEFAULT_POOL = {"max_connections": 8, "max_keepalive_connections": 8, "keepalive_expiry": 30.0}
+DEFAULT_TIMEOUTS = {"connect": 5.0, "read": 60.0, "write": 10.0, "pool": 30.0}
+# zdrowie endpointów (settings.endpoint_health) i zapytania zapasowe (settings.hedging)
+DEFAULT_HEALTH = {"failure_threshold": 3, "cooldown": 30.0}
+DEFAULT_HEDGING = {"enabled": False, "quantile": 0.95, "min_samples": 20, "min_delay": 0.25, "window": 200}
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """Zwraca (i przy pierwszym użyciu uruchamia) pętlę asyncio w wątku w tle."""
+    global _loop, _loop_thread
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True)
+            _loop_thread.start()
+    return _loop
+
+
+def run_sync(coro):
+    """
+    Wykonuje korutynę synchronicznie (na pętli w tle) i zwraca jej wynik.
+
+    Nie wolno wywoływać z samej pętli w tle - to zakleszczyłoby wątek.
+    """
+    loop = get_background_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() wywołane z pętli w tle - użyj wersji *_async")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def iterate_sync(async_iterable):
+    """
+    Generator synchroniczny po asynchronicznym iteratorze wykonywanym na pętli w tle.
+
+    Elementy są przekazywane na bieżąco (kolejką), wyjątek z iteratora jest
+    rzucany w wątku wywołującym, a przerwanie iteracji anuluje pracę na pętli.
+    """
+    loop = get_background_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("iterate_sync() wywołane z pętli w tle - użyj wersji *_async")
+
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put(item)
+        finally:
+            items.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), loop)
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+        future.result()
+    finally:
+        future.cancel()
+
+
+def is_endpoint_failure(error):
+    """
+    Czy błąd świadczy o kłopocie endpointu (połączenie, timeout, 5xx, 429),
+    a nie o samym zapytaniu (pozostałe 4xx - inny endpoint odpowie tak samo)?
+    """
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status == 429
+
+
+class ClientRegistry:
+    """
+    Rejestr klientów AsyncOpenAI i limitów współbieżności per api_type.
+
+    Klienci i semafory są osobne dla każdej pętli asyncio (obiekty asyncio
+    i połączenia HTTP nie mogą być dzielone między pętlami). Synchroniczne API
+    korzysta z jednej pętli w tle, więc w praktyce każdy endpoint ma jedną
+    pulę połączeń, współdzieloną przez wszystkie wywołania.
+
+    api_type może mieć kilka endpointów (lista adresów, np. kilka instancji
+    LM Studio). Stan endpointów (trwające zapytania, błędy, zdrowie) jest
+    wspólny dla wszystkich pętli.
+
+    Przykład:
+        url = registry.acquire("local")                  # najmniej obciążony zdrowy endpoint
+        try:
+            async with registry.semaphore("local", url):
+                response = await registry.client("local", url).chat.completions.create(...)
+            registry.release("local", url, "ok", elapsed)
+            registry.observe_latency(model_name, elapsed)   # okno hedgingu (czas całego wywołania)
+        except Exception:
+            registry.release("local", url, "error")
+    """
+
+    def __init__(self, endpoints, api_keys, concurrency=None, default_concurrency=4,
+                 pool=None, timeouts=None, health=None, hedging=None, clock=time.monotonic):
+        """
+        Args:
+            endpoints: Słownik api_type -> base_url albo lista base_url (config['api_endpoints'])
+            api_keys: Słownik api_type -> klucz API (config['api_keys'])
+            concurrency: Słownik api_type -> maks. liczba równoległych zapytań do jednego endpointu
+            default_concurrency: Limit dla api_type bez wpisu w concurrency
+            pool: Ustawienia puli połączeń (max_connections, max_keepalive_connections,
+                  keepalive_expiry) - brakujące klucze z DEFAULT_POOL
+            timeouts: Timeouty w sekundach (connect, read, write, pool) - brakujące z DEFAULT_TIMEOUTS
+            health: failure_threshold (błędy z rzędu) i cooldown [s] - brakujące z DEFAULT_HEALTH
+            hedging: quantile, min_samples, min_delay [s], window - brakujące z DEFAULT_HEDGING
+            clock: Źródło czasu (do testów)
+        """
+        self.endpoints = endpoints
+        self.api_keys = api_keys
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.pool = {**DEFAULT_POOL, **(pool or {})}
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.health = {**DEFAULT_HEALTH, **(health or {})}
+        self.hedging = {**DEFAULT_HEDGING, **(hedging or {})}
+        self._clock = clock
+        self._per_loop = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._counters = {}
+        # (api_type, url) -> stan endpointu; model -> ostatnie czasy odpowiedzi [s]
+        self._endpoints = {}
+        self._latencies = {}
+
+    def urls(self, api_type):
+        """Lista endpointów api_type (pojedynczy adres w konfiguracji = pula jednoelementowa)."""
+        urls = self.endpoints[api_type]
+        return [urls] if isinstance(urls, str) else list(urls)
+
+    def _endpoint(self, api_type, url):
+        """Stan endpointu (wywoływane pod blokadą)."""
+        key = (api_type, url)
+        if key not in self._endpoints:
+            self._endpoints[key] = {"outstanding": 0, "requests": 0, "errors": 0, "consecutive_failures": 0,
+                                    "latency_ewma": 0.0, "unhealthy_until": 0.0, "hedges": 0, "hedge_wins": 0}
+        return self._endpoints[key]
+
+    def acquire(self, api_type, exclude=(), healthy_only=False):
+        """
+        Wybiera endpoint dla nowego zapytania i liczy je jako trwające.
+
+        Wybór: zdrowy endpoint z najmniejszą liczbą trwających zapytań (remis -
+        krótszy średni czas odpowiedzi, endpoint bez pomiarów najpierw). Gdy żaden
+        nie jest zdrowy - ten, którego cooldown kończy się najwcześniej (zapytanie
+        sprawdza, czy już działa).
+
+        Args:
+            exclude: Endpointy do pominięcia (np. już użyte przez to wywołanie)
+            healthy_only: None zamiast endpointu w cooldownie (zapytania zapasowe)
+
+        Returns:
+            str lub None: base_url; każde acquire wymaga release()
+        """
+        now = self._clock()
+        with self._lock:
+            candidates = [(url, self._endpoint(api_type, url)) for url in self.urls(api_type) if url not in exclude]
+            healthy = [item for item in candidates if item[1]["unhealthy_until"] <= now]
+            if healthy:
+                url, state = min(healthy, key=lambda item: (item[1]["outstanding"], item[1]["latency_ewma"],
+                                                            item[1]["requests"]))
+            elif candidates and not healthy_only:
+                url, state = min(candidates, key=lambda item: item[1]["unhealthy_until"])
+            else:
+                return None
+            state["outstanding"] += 1
+            state["requests"] += 1
+            return url
+
+    def available(self, api_type, exclude=()):
+        """Czy jest zdrowy endpoint spoza exclude (np. na zapytanie zapasowe)?"""
+        now = self._clock()
+        with self._lock:
+            return any(self._endpoint(api_type, url)["unhealthy_until"] <= now
+                       for url in self.urls(api_type) if url not in exclude)
+
+    def release(self, api_type, url, outcome, elapsed=None):
+        """
+        Kończy zapytanie rozpoczęte przez acquire().
+
+        Args:
+            outcome: "ok", "error" (błąd endpointu - liczony do zdrowia), "rejected"
+                     (błąd samego zapytania, np. 400) albo "cancelled"
+            elapsed: Czas zapytania [s] - dla "ok" aktualizuje średni czas endpointu
+        """
+        with self._lock:
+            state = self._endpoint(api_type, url)
+            state["outstanding"] -= 1
+            if outcome == "ok":
+                state["consecutive_failures"] = 0
+                state["unhealthy_until"] = 0.0
+                if elapsed is not None:
+                    ewma = state["latency_ewma"]
+                    state["latency_ewma"] = elapsed if not ewma else 0.8 * ewma + 0.2 * elapsed
+            elif outcome == "error":
+                state["errors"] += 1
+                state["consecutive_failures"] += 1
+                if state["consecutive_failures"] >= self.health["failure_threshold"]:
+                    state["unhealthy_until"] = self._clock() + self.health["cooldown"]
+
+    def observe_latency(self, key, elapsed):
+        """
+        Dopisuje czas całego wywołania modelu key do okna hedgingu.
+
+        elapsed liczony od wysłania pierwszego zapytania wywołania (po lokalnej
+        kolejce semafora), także gdy wygrało zapytanie zapasowe albo było
+        ponowienie - samo zwycięskie zapytanie (od swojego, późniejszego startu)
+        zaniżałoby kwantyl, a anulowane wolne byłyby pominięte.
+        """
+        with self._lock:
+            window = self._latencies.setdefault(key, deque(maxlen=self.hedging["window"]))
+            window.append(elapsed)
+
+    def hedge_delay(self, key):
+        """
+        Termin zapytania zapasowego dla modelu key: kwantyl (domyślnie p95)
+        ostatnich czasów wywołań (observe_latency), nie mniej niż min_delay.
+
+        Returns:
+            float lub None: sekundy; None = za mało pomiarów (bez hedgingu)
+        """
+        with self._lock:
+            window = sorted(self._latencies.get(key, ()))
+        if len(window) < max(self.hedging["min_samples"], 1):
+            return None
+        # kwantyl metodą najbliższej rangi
+        index = min(max(math.ceil(self.hedging["quantile"] * len(window)) - 1, 0), len(window) - 1)
+        return max(window[index], self.hedging["min_delay"])
+
+    def count_hedge(self, api_type, url, won):
+        """Zapisuje zapytanie zapasowe wysłane do url (won - odpowiedziało pierwsze)."""
+        with self._lock:
+            state = self._endpoint(api_type, url)
+            state["hedges"] += 1
+            state["hedge_wins"] += int(won)
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._per_loop.get(loop)
+            if state is None:
+                state = {"clients": {}, "http_clients": {}, "semaphores": {}}
+                self._per_loop[loop] = state
+        return state
+
+    def _count(self, api_type, key):
+        with self._lock:
+            counters = self._counters.setdefault(api_type, {"requests": 0, "connections_opened": 0})
+            counters[key] += 1
+
+    def _http_client(self, api_type):
+        """Tworzy klienta httpx z ograniczoną pulą i licznikami zapytań / nowych połączeń."""
+
+        async def trace(event, info):
+            # zdarzenie httpcore - nowe połączenie TCP (a nie ponowne użycie keep-alive)
+            if event == "connection.connect_tcp.complete":
+                self._count(api_type, "connections_opened")
+
+        async def on_request(request):
+            self._count(api_type, "requests")
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool["max_connections"],
+                max_keepalive_connections=self.pool["max_keepalive_connections"],
+                keepalive_expiry=self.pool["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(**self.timeouts),
+            event_hooks={"request": [on_request]},
+        )
+
+    def client(self, api_type, url=None):
+        """Zwraca klienta AsyncOpenAI dla endpointu url (domyślnie pierwszego z puli api_type) w bieżącej pętli."""
+        key = (api_type, url or self.urls(api_type)[0])
+        state = self._state()
+        clients = state["clients"]
+        if key not in clients:
+            from openai import AsyncOpenAI
+
+            http_client = self._http_client(api_type)
+            state["http_clients"][key] = http_client
+            # bez ponowień w SDK - błąd ma od razu trafić do zdrowia endpointu i failoveru
+            # (inaczej cooldown i przełączenie spóźniają się, a czasy ponowień zawyżają okno hedgingu)
+            clients[key] = AsyncOpenAI(base_url=key[1],
+                                       api_key=self.api_keys[api_type],
+                                       http_client=http_client,
+                                       max_retries=0)
+        return clients[key]
+
+    def semaphore(self, api_type, url=None):
+        """Zwraca semafor ograniczający równoległe zapytania do endpointu url (domyślnie pierwszego z puli)."""
+        key = (api_type, url or self.urls(api_type)[0])
+        semaphores = self._state()["semaphores"]
+        if key not in semaphores:
+            limit = self.concurrency.get(api_type, self.default_concurrency)
+            semaphores[key] = asyncio.Semaphore(limit)
+        return semaphores[key]
+
+    def pool_stats(self):
+        """
+        Zwraca statystyki pul połączeń per api_type (suma po pętlach asyncio).
+
+        Returns:
+            dict: api_type -> requests, connections_opened, reused (zapytania na
+                  istniejącym połączeniu keep-alive), reuse_rate, open_connections
+                  (aktualnie otwarte), max_connections
+        """
+        with self._lock:
+            counters = {api_type: dict(values) for api_type, values in self._counters.items()}
+            states = list(self._per_loop.values())
+
+        open_connections = {}
+        for state in states:
+            for (api_type, _), http_client in state["http_clients"].items():
+                # httpx nie udostępnia puli publicznie - liczymy, jeśli transport ją ma
+                pool = getattr(http_client._transport, "_pool", None)
+                count = len(pool.connections) if pool is not None else 0
+                open_connections[api_type] = open_connections.get(api_type, 0) + count
+
+        stats = {}
+        for api_type, values in counters.items():
+            requests = values["requests"]
+            reused = max(requests - values["connections_opened"], 0)
+            stats[api_type] = {
+                **values,
+                "reused": reused,
+                "reuse_rate": reused / requests if requests else 0.0,
+                "open_connections": open_connections.get(api_type, 0),
+                "max_connections": self.pool["max_connections"],
+            }
+        return stats
+
+    def endpoint_stats(self):
+        """
+        Zwraca stan endpointów per api_type.
+
+        Returns:
+            dict: api_type -> lista {url, healthy, outstanding, requests, errors,
+                  consecutive_failures, latency_ewma [s], hedges, hedge_wins}
+        """
+        now = self._clock()
+        stats = {}
+        with self._lock:
+            for api_type in self.endpoints:
+                stats[api_type] = []
+                for url in self.urls(api_type):
+                    state = dict(self._endpoint(api_type, url))
+                    unhealthy_until = state.pop("unhealthy_until")
+                    stats[api_type].append({"url": url, "healthy": unhealthy_until <= now, **state})
+        return stats
+
+    async def aclose(self):
+        """Zamyka klientów (i połączenia) utworzonych w bieżącej pętli."""
+        state = self._state()
+        for client in state["clients"].values():
+            await client.close()
+        state["clients"].clear()
+        state["http_clients"].clear()
@@ -0,0 +1,170 @@
+"""
+Lokalny klasyfikator pytań na embeddingach (bez wywołania LLM).
+
+Każda kategoria (on_topic / off_topic / manipulation) ma centroid -
+znormalizowaną średnią embeddingów przykładów. Pytanie trafia do kategorii
+najbliższego centroidu, ale tylko gdy przewaga nad drugą kategorią (margin)
+jest wystarczająca; w przeciwnym razie predict() zwraca None i decyzja
+przechodzi do klasyfikatora LLM (eskalacja).
+
+Centroidy liczone są z sum embeddingów, więc add_examples() (np. przejrzane
+werdykty LLM z eskalacji) aktualizuje je w O(1) na przykład. learn() to
+nauka online bez przeglądu: z limitem przykładów na kategorię i bez
+prawie-duplikatów, żeby seria podobnych (np. złośliwych) pytań nie mogła
+przesunąć centroidu.
+"""
+
+import threading
+
+import numpy as np
+
+from retrieval import normalize_embeddings
+
+
+class CentroidClassifier:
+    """
+    Klasyfikator "najbliższy centroid" z progiem pewności.
+
+    Przykład:
+        classifier = CentroidClassifier(embedding_model.encode, margin=0.08)
+        classifier.fit(examples)                       # {"on_topic": [...], ...}
+        label, margin = classifier.predict(query_embedding)   # label None = eskaluj do LLM
+    """
+
+    def __init__(self, encode, margin=0.08, min_similarity=0.3, learn_limit=200, duplicate_similarity=0.95):
+        """
+        Args:
+            encode: Funkcja kodująca listę tekstów, np. embedding_model.encode
+            margin: Minimalna różnica podobieństwa 1. i 2. kategorii do decyzji lokalnej
+            min_similarity: Minimalne podobieństwo do najbliższego centroidu
+            learn_limit: Maks. liczba przykładów z learn() na kategorię
+            duplicate_similarity: learn() pomija przykład co najmniej tak podobny do już nauczonego
+        """
+        self.encode = encode
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self.learn_limit = learn_limit
+        self.duplicate_similarity = duplicate_similarity
+        self._learned = {}
+        self.learn_skipped = 0
+        self.labels = []
+        self._sums = None
+        self._counts = None
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.local = 0
+        self.escalated = 0
+
+    def fit(self, examples):
+        """
+        Liczy centroidy od zera.
+
+        Args:
+            examples: Słownik kategoria -> lista przykładowych pytań
+        """
+        labels = list(examples)
+        sums = []
+        counts = []
+        for label in labels:
+            embeddings = normalize_embeddings(np.atleast_2d(self.encode(list(examples[label]))))
+            sums.append(embeddings.sum(axis=0))
+            counts.append(len(embeddings))
+
+        with self._lock:
+            self.labels = labels
+            self._sums = np.stack(sums)
+            self._counts = np.array(counts)
+            self._centroids = normalize_embeddings(self._sums)
+
+    def add_examples(self, texts, labels, embeddings=None):
+        """
+        Dopisuje oznaczone przykłady (np. zalogowane werdykty LLM) do centroidów.
+
+        Args:
+            texts: Lista pytań
+            labels: Kategorie pytań (muszą istnieć w fit())
+            embeddings: Gotowe embeddingi texts - None = zakoduj
+        """
+        if embeddings is None:
+            embeddings = self.encode(list(texts))
+        embeddings = normalize_embeddings(np.atleast_2d(embeddings))
+
+        with self._lock:
+            sums = self._sums.copy()
+            counts = self._counts.copy()
+            for embedding, label in zip(embeddings, labels):
+                row = self.labels.index(label)
+                sums[row] += embedding
+                counts[row] += 1
+            self._sums, self._counts = sums, counts
+            self._centroids = normalize_embeddings(sums)
+
+    def learn(self, text, label, embedding=None):
+        """
+        Nauka online z werdyktu bez przeglądu (np. klasyfikatora LLM).
+
+        Returns:
+            bool: True = przykład dopisany; False = limit kategorii albo prawie-duplikat
+        """
+        if embedding is None:
+            embedding = self.encode([text])
+        embedding = normalize_embeddings(np.atleast_2d(embedding))[0]
+
+        with self._lock:
+            learned = self._learned.setdefault(label, [])
+            if (len(learned) >= self.learn_limit
+                    or (learned and float(np.max(np.stack(learned) @ embedding)) >= self.duplicate_similarity)):
+                self.learn_skipped += 1
+                return False
+            learned.append(embedding)
+
+        self.add_examples([text], [label], embeddings=embedding)
+        return True
+
+    def scores(self, query_embedding):
+        """Podobieństwo zapytania do centroidu każdej kategorii (słownik)."""
+        query = normalize_embeddings(np.atleast_2d(query_embedding))[0]
+        with self._lock:
+            similarities = self._centroids @ query
+            return dict(zip(self.labels, similarities.tolist()))
+
+    def predict(self, query_embedding):
+        """
+        Klasyfikuje zapytanie lokalnie.
+
+        Returns:
+            tuple: (kategoria albo None przy zbyt małej pewności, margin)
+        """
+        ranked = sorted(self.scores(query_embedding).items(), key=lambda item: item[1], reverse=True)
+        (label, best), (_, second) = ranked[0], ranked[1]
+        margin = best - second
+
+        confident = margin >= self.margin and best >= self.min_similarity
+        return (label if confident else None), margin
+
+    def record(self, escalated):
+        """Liczy decyzję: lokalną (escalated=False) albo przekazaną do LLM (True)."""
+        with self._lock:
+            if escalated:
+                self.escalated += 1
+            else:
+                self.local += 1
+
+    def stats(self):
+        """
+        Zwraca statystyki klasyfikatora.
+
+        Returns:
+            dict: local, escalated, escalation_rate, examples (liczba przykładów per kategoria),
+                  learned (przykłady z learn() per kategoria), learn_skipped
+        """
+        with self._lock:
+            total = self.local + self.escalated
+            return {
+                "local": self.local,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / total if total else 0.0,
+                "examples": dict(zip(self.labels, self._counts.tolist())) if self._counts is not None else {},
+                "learned": {label: len(learned) for label, learned in self._learned.items()},
+                "learn_skipped": self.learn_skipped,
+            }
@@ -0,0 +1,227 @@
+"""
+Lekka instrumentacja pipeline'u: histogramy czasów etapów i tokenów w pamięci procesu.
+
+- stage(): context manager mierzący czas etapu (rewrite, classify, embed,
+  retrieval, generate, validate, ...) z etykietą wyniku (outcome),
+- observe(): pojedyncza obserwacja histogramu (np. tokeny wywołania LLM),
+- snapshot() / to_json() / to_prometheus(): eksport (słownik, JSON, format
+  tekstowy Prometheusa).
+
+Wyłączony rejestr (enabled=False) zwraca ze stage() współdzielony pusty
+obiekt i nic nie zapisuje - koszt to jedno sprawdzenie flagi.
+
+Bieżący etap trzymany jest w zmiennej kontekstowej, więc wywołania LLM
+wewnątrz etapu (także w innych zadaniach asyncio i w asyncio.to_thread)
+mogą być etykietowane nazwą etapu (current_stage()).
+"""
+
+import bisect
+import contextvars
+import json
+import threading
+import time
+
+# granice kubełków histogramów (jak w klientach Prometheusa)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+
+def current_stage():
+    """Nazwa etapu, w którym działa bieżący kod (None poza etapami)."""
+    return _current_stage.get()
+
+
+class Histogram:
+    """Histogram kubełkowy: liczniki per kubełek, suma i liczba obserwacji."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # ostatni kubełek = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Szacunek kwantyla z kubełków (interpolacja liniowa w kubełku, jak histogram_quantile).
+
+        Dla wartości powyżej ostatniej granicy zwraca ostatnią granicę.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return float(self.buckets[-1])
+
+    def cumulative(self):
+        """Liczniki skumulowane per granica (ostatni = +Inf = count)."""
+        totals = []
+        running = 0
+        for count in self.counts:
+            running += count
+            totals.append(running)
+        return totals
+
+
+class _NullSpan:
+    """Pusty etap zwracany przez wyłączony rejestr."""
+
+    __slots__ = ("outcome",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Mierzony etap; outcome można ustawić w środku bloku (domyślnie "ok" / "error" / "cancelled")."""
+
+    __slots__ = ("registry", "stage", "outcome", "start", "token")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+        self.outcome = None
+
+    def __enter__(self):
+        self.token = _current_stage.set(self.stage)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        try:
+            _current_stage.reset(self.token)
+        except ValueError:
+            # zamknięcie w innym kontekście (np. generator asynchroniczny sprzątany przez GC)
+            pass
+
+        outcome = self.outcome
+        if exc_type is not None:
+            outcome = "cancelled" if exc_type.__name__ == "CancelledError" else "error"
+        self.registry.observe("rag_stage_seconds", elapsed, stage=self.stage, outcome=outcome or "ok")
+        return False
+
+
+class MetricsRegistry:
+    """
+    Rejestr histogramów z etykietami.
+
+    Przykład:
+        metrics = MetricsRegistry(enabled=True)
+        with metrics.stage("validate") as span:
+            score = ...
+            span.outcome = "pass" if score >= 7 else "fail"
+        print(metrics.to_prometheus())
+    """
+
+    HELP = {
+        "rag_stage_seconds": "Czas etapu pipeline'u asystenta [s]",
+        "rag_llm_call_seconds": "Czas wywołania LLM [s]",
+        "rag_llm_prompt_tokens": "Tokeny promptu na wywołanie LLM",
+        "rag_llm_completion_tokens": "Tokeny odpowiedzi na wywołanie LLM",
+        "rag_llm_queue_seconds": "Czas oczekiwania na miejsce w limicie endpointu [s]",
+    }
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def stage(self, name):
+        """Context manager mierzący czas etapu name (pusty, gdy rejestr wyłączony)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, value, **labels):
+        """Dopisuje obserwację do histogramu name z podanymi etykietami."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                buckets = LATENCY_BUCKETS if name.endswith("_seconds") else TOKEN_BUCKETS
+                histogram = self._series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        """Usuwa wszystkie obserwacje."""
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self):
+        """
+        Zwraca kopię stanu rejestru.
+
+        Returns:
+            dict: nazwa -> lista serii {"labels", "count", "sum", "mean", "p50",
+                  "p95", "p99", "buckets" (granica -> licznik skumulowany)}
+        """
+        with self._lock:
+            series = [(key, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                      for key, histogram in self._series.items()]
+
+        result = {}
+        for (name, labels), buckets, counts, total, count in sorted(series, key=lambda item: item[0]):
+            histogram = Histogram(buckets)
+            histogram.counts, histogram.sum, histogram.count = counts, total, count
+            bounds = [str(bound) for bound in buckets] + ["+Inf"]
+            result.setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else 0.0,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+                "buckets": dict(zip(bounds, histogram.cumulative())),
+            })
+        return result
+
+    def to_json(self, indent=2):
+        """Snapshot jako tekst JSON."""
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Snapshot w formacie tekstowym Prometheusa (histogramy: _bucket, _sum, _count)."""
+        lines = []
+        for name, series_list in self.snapshot().items():
+            lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for series in series_list:
+                labels = ",".join(f'{key}="{_escape(value)}"' for key, value in series["labels"].items())
+                prefix = labels + "," if labels else ""
+                for bound, count in series["buckets"].items():
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {series['sum']}")
+                lines.append(f"{name}_count{suffix} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    """Escapowanie wartości etykiety w formacie Prometheusa."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,110 @@
+"""
+Cache LRU dla embeddingów zapytań.
+
+Częste, identyczne pytania (np. "Jak podlewać monsterę?") nie muszą za każdym
+razem przechodzić przez model SentenceTransformer. Kluczem jest znormalizowany
+tekst zapytania (małe litery, bez nadmiarowych spacji).
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Normalizuje tekst zapytania do klucza cache (casefold + pojedyncze spacje)."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Ograniczony rozmiarem cache LRU przed kodowaniem zapytań.
+
+    Przykład:
+        cache = QueryEmbeddingCache(embedding_model.encode, max_size=1024)
+        query_embedding = cache.encode(["Jak podlewać monsterę?"])[0]
+    """
+
+    def __init__(self, encode, max_size=1024):
+        """
+        Args:
+            encode: Funkcja kodująca listę tekstów, np. embedding_model.encode
+            max_size: Maksymalna liczba zapamiętanych zapytań (0 = cache wyłączony)
+        """
+        self._encode = encode
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def encode(self, queries):
+        """
+        Zwraca embeddingi zapytań; model koduje (jednym wywołaniem) tylko brakujące.
+
+        Args:
+            queries: Lista zapytań (list[str])
+
+        Returns:
+            np.ndarray: Macierz embeddingów (len(queries), dim)
+        """
+        queries = list(queries)
+        keys = [normalize_query(q) for q in queries]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+
+        # unikalne brakujące klucze (kodujemy pierwszy oryginalny tekst dla klucza)
+        missing = {}
+        for key, query in zip(keys, queries):
+            if key not in found and key not in missing:
+                missing[key] = query
+
+        if missing:
+            embeddings = np.atleast_2d(self._encode(list(missing.values())))
+            for key, embedding in zip(missing, embeddings):
+                embedding.setflags(write=False)
+                found[key] = embedding
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            if self.max_size > 0:
+                for key in missing:
+                    self._entries[key] = found[key]
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return np.stack([found[key] for key in keys])
+
+    def clear(self):
+        """Czyści cache (liczniki zostają)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Zwraca statystyki cache.
+
+        Returns:
+            dict: hits, misses, hit_rate, size, max_size
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
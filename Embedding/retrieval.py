@@ -0,0 +1,460 @@
+"""
+Silnik wyszukiwania semantycznego dla asystenta RAG "Zielony Doom".
+
+Embeddingi bazy wiedzy trzymane są jako jedna, znormalizowana macierz float32,
+więc podobieństwo kosinusowe to zwykły iloczyn skalarny:
+- jedno zapytanie  -> jeden iloczyn macierz-wektor,
+- wiele zapytań    -> jeden iloczyn macierz-macierz.
+Top-k wybierany jest przez np.argpartition (bez sortowania całej bazy).
+
+Dla dużych baz (100k+ faktów) dostępny jest przybliżony indeks IVF
+(IVFRetriever), a dla oszczędności pamięci - kody float16 / int8 z dokładnym
+re-scoringiem (QuantizedRetriever); DenseRetriever pozostaje dokładnym
+trybem referencyjnym.
+"""
+
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+# porcja kodów zamienianych na float32 przy wyszukiwaniu zgrubnym - mieści się w cache L2,
+# więc kody czytane są z RAM raz, a iloczyn liczy BLAS na gorących danych
+SCORE_CHUNK_BYTES = 1 << 19
+
+
+def normalize_embeddings(embeddings):
+    """
+    Zamienia embeddingi na float32 i normalizuje każdy wiersz do długości 1.
+
+    Args:
+        embeddings: Wektor (dim,) lub macierz (n, dim)
+
+    Returns:
+        np.ndarray: Znormalizowana tablica float32 o tym samym kształcie
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+
+    # zerowe wektory zostawiamy zerowe (zamiast dzielić przez 0)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def top_k_from_scores(scores, top_k):
+    """
+    Wybiera top-k największych wyników w każdym wierszu.
+
+    Args:
+        scores: Macierz podobieństw (n_queries, n_facts)
+        top_k: Liczba zwracanych wyników (int)
+
+    Returns:
+        tuple: (indeksy, podobieństwa), obie tablice (n_queries, k),
+               posortowane malejąco po podobieństwie
+    """
+    n_facts = scores.shape[1]
+    k = min(top_k, n_facts)
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    # argpartition: O(n) zamiast pełnego sortowania, potem sortujemy tylko k kandydatów
+    if k < n_facts:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_facts), (scores.shape[0], n_facts))
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+
+    indices = np.take_along_axis(candidates, order, axis=1)
+    similarities = np.take_along_axis(candidate_scores, order, axis=1)
+    return indices, similarities
+
+
+class DenseRetriever:
+    """
+    Dokładne wyszukiwanie top-k po podobieństwie kosinusowym.
+
+    Trzyma znormalizowaną macierz float32 (n_facts, dim) i ocenia zapytania
+    jednym mnożeniem macierzowym. Jeśli embeddingi są już znormalizowane
+    (np. memmap z EmbeddingStore), normalized=True pozwala uniknąć kopii w RAM.
+    """
+
+    def __init__(self, embeddings, normalized=False):
+        if normalized:
+            self.matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        else:
+            self.matrix = normalize_embeddings(np.atleast_2d(embeddings))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def memory_bytes(self):
+        """Rozmiar macierzy float32 w bajtach."""
+        return self.matrix.nbytes
+
+    def search(self, query_embedding, top_k=5):
+        """
+        Wyszukuje top-k faktów dla jednego zapytania.
+
+        Args:
+            query_embedding: Embedding zapytania (dim,)
+            top_k: Liczba zwracanych faktów (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (k,), malejąco
+        """
+        indices, similarities = self.search_batch(np.atleast_2d(query_embedding), top_k)
+        return indices[0], similarities[0]
+
+    def search_batch(self, query_embeddings, top_k=5):
+        """
+        Wyszukuje top-k faktów dla wielu zapytań naraz.
+
+        Args:
+            query_embeddings: Embeddingi zapytań (n_queries, dim)
+            top_k: Liczba zwracanych faktów na zapytanie (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (n_queries, k), malejąco
+        """
+        queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+        scores = queries @ self.matrix.T
+        return top_k_from_scores(scores, top_k)
+
+
+class IVFRetriever:
+    """
+    Przybliżone wyszukiwanie top-k (ANN) - indeks IVF (inverted file).
+
+    Wektory dzielone są k-means na n_lists klastrów (list odwróconych).
+    Zapytanie ocenia najpierw centroidy, a potem tylko wektory z n_probe
+    najbliższych list. Parametry:
+    - n_lists: więcej list = mniejsze listy = szybciej, ale niższy recall
+    - n_probe: więcej przeszukiwanych list = wyższy recall, ale wolniej
+      (n_probe >= n_lists daje wynik dokładny)
+    """
+
+    def __init__(self, embeddings, n_lists=None, n_probe=8, normalized=False,
+                 n_iter=10, seed=0, _structure=None):
+        if normalized:
+            self.matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        else:
+            self.matrix = normalize_embeddings(np.atleast_2d(embeddings))
+
+        n_facts = self.matrix.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_facts))
+        self.n_lists = max(1, min(n_lists, n_facts))
+        self.n_probe = n_probe
+
+        if _structure is not None:
+            self.centroids, self.order, self.offsets = _structure
+        else:
+            self._build(n_iter, seed)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def memory_bytes(self):
+        """Rozmiar macierzy float32 i struktury IVF w bajtach."""
+        return self.matrix.nbytes + self.centroids.nbytes + self.order.nbytes + self.offsets.nbytes
+
+    def _assign(self, vectors, chunk_size=65536):
+        """Przypisuje wektory do najbliższych centroidów (porcjami, żeby ograniczyć RAM)."""
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size])
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def _build(self, n_iter, seed):
+        """Uczy centroidy (sferyczny k-means na próbce) i buduje listy odwrócone."""
+        rng = np.random.default_rng(seed)
+        n_facts = self.matrix.shape[0]
+
+        sample_size = min(n_facts, self.n_lists * 64)
+        sample = np.asarray(self.matrix[np.sort(rng.choice(n_facts, sample_size, replace=False))])
+        self.centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            labels = np.argmax(sample @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.n_lists)
+
+            # pusty klaster dostaje losowy punkt z próbki
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            self.centroids = normalize_embeddings(sums)
+
+        assignments = self._assign(self.matrix)
+        self.order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, query_embedding, top_k=5):
+        """
+        Wyszukuje top-k faktów dla jednego zapytania.
+
+        Args:
+            query_embedding: Embedding zapytania (dim,)
+            top_k: Liczba zwracanych faktów (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (k,), malejąco
+        """
+        indices, similarities = self.search_batch(np.atleast_2d(query_embedding), top_k)
+        return indices[0], similarities[0]
+
+    def search_batch(self, query_embeddings, top_k=5):
+        """
+        Wyszukuje top-k faktów dla wielu zapytań naraz.
+
+        Centroidy oceniane są jednym iloczynem macierz-macierz, kandydaci
+        z wybranych list - osobno dla każdego zapytania.
+
+        Args:
+            query_embeddings: Embeddingi zapytań (n_queries, dim)
+            top_k: Liczba zwracanych faktów na zapytanie (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (n_queries, k), malejąco
+        """
+        queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+        k = min(top_k, len(self))
+
+        probe_lists, _ = top_k_from_scores(queries @ self.centroids.T, self.n_probe)
+
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        similarities = np.empty((queries.shape[0], k), dtype=np.float32)
+
+        for row, (query, lists) in enumerate(zip(queries, probe_lists)):
+            candidates = np.concatenate(
+                [self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+            )
+
+            # za mało kandydatów w przeszukanych listach - wynik dokładny
+            if len(candidates) < k:
+                candidates = np.arange(len(self))
+
+            scores = np.asarray(self.matrix[candidates]) @ query
+            local, local_scores = top_k_from_scores(scores[np.newaxis, :], k)
+            indices[row] = candidates[local[0]]
+            similarities[row] = local_scores[0]
+
+        return indices, similarities
+
+    def save(self, path, fingerprint):
+        """
+        Zapisuje strukturę indeksu (centroidy + listy) obok embeddingów.
+
+        Args:
+            path: Ścieżka pliku .npz
+            fingerprint: Identyfikator embeddingów, z których zbudowano indeks
+        """
+        np.savez(
+            path,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            fingerprint=np.array(fingerprint),
+        )
+
+    @classmethod
+    def load(cls, path, embeddings, fingerprint, n_probe=8, normalized=True):
+        """
+        Wczytuje indeks zapisany przez save().
+
+        Returns:
+            IVFRetriever lub None, jeśli pliku nie ma, jest uszkodzony
+            (np. urwany zapis) albo indeks zbudowano z innych embeddingów
+        """
+        try:
+            with np.load(path) as data:
+                if str(data["fingerprint"]) != fingerprint or int(data["offsets"][-1]) != len(embeddings):
+                    return None
+                structure = (data["centroids"], data["order"], data["offsets"])
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile, zlib.error):
+            return None
+
+        return cls(embeddings, n_lists=len(structure[0]), n_probe=n_probe,
+                   normalized=normalized, _structure=structure)
+
+
+class QuantizedRetriever:
+    """
+    Wyszukiwanie na skompresowanych embeddingach + dokładny re-scoring.
+
+    Kody w RAM:
+    - "float16": 2 bajty na wymiar,
+    - "int8": 1 bajt na wymiar + skala float32 na wektor (kwantyzacja skalarna).
+    Wyszukiwanie zgrubne liczone jest na kodach, a top_k * rescore_factor
+    kandydatów jest oceniane ponownie na wektorach float32 (matrix). Jeśli
+    matrix to memmap z EmbeddingStore, czytane są tylko wiersze kandydatów,
+    a pliki dzielone są przez wszystkie procesy workerów.
+
+    Czas zapytania: int8 jest porównywalny z DenseRetriever (czyta 4x mniej
+    pamięci), float16 jest kilka razy wolniejszy - numpy zamienia float16 na
+    float32 bez wektoryzacji. float16 opłaca się tylko dla oszczędności RAM.
+    """
+
+    def __init__(self, embeddings, dtype="int8", rescore_factor=4, normalized=False,
+                 chunk_size=8192):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Nieobsługiwany typ kwantyzacji: {dtype}")
+
+        if normalized:
+            self.matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        else:
+            self.matrix = normalize_embeddings(np.atleast_2d(embeddings))
+
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self.chunk_size = chunk_size
+
+        n_facts, dim = self.matrix.shape
+        self.codes = np.empty((n_facts, dim), dtype=np.int8 if dtype == "int8" else np.float16)
+        self.scales = np.ones(n_facts, dtype=np.float32) if dtype == "int8" else None
+        self.score_rows = max(SCORE_CHUNK_BYTES // (4 * dim), 64)
+
+        # kodowanie porcjami, żeby nie trzymać całej macierzy float32 w RAM
+        for start in range(0, n_facts, chunk_size):
+            chunk = np.asarray(self.matrix[start:start + chunk_size])
+            if dtype == "int8":
+                scales = np.abs(chunk).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                self.codes[start:start + chunk_size] = np.round(chunk / scales[:, np.newaxis])
+                self.scales[start:start + chunk_size] = scales
+            else:
+                self.codes[start:start + chunk_size] = chunk
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def memory_bytes(self):
+        """Rozmiar kodów w RAM (bez wektorów float32 do re-scoringu)."""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _coarse_scores(self, queries):
+        """
+        Przybliżone podobieństwa (n_queries, n_facts) liczone na kodach.
+
+        Kody zamieniane są na float32 małymi porcjami (score_rows wierszy) do
+        jednego bufora - bez kopii całej macierzy i bez alokacji na porcję.
+        """
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        buffer = np.empty((self.score_rows, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), self.score_rows):
+            end = min(start + self.score_rows, len(self))
+            chunk = buffer[:end - start]
+            np.copyto(chunk, self.codes[start:end], casting="unsafe")
+            chunk_scores = scores[:, start:end]
+            np.matmul(queries, chunk.T, out=chunk_scores)
+            if self.scales is not None:
+                chunk_scores *= self.scales[start:end]
+        return scores
+
+    def search(self, query_embedding, top_k=5):
+        """
+        Wyszukuje top-k faktów dla jednego zapytania.
+
+        Args:
+            query_embedding: Embedding zapytania (dim,)
+            top_k: Liczba zwracanych faktów (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (k,), malejąco
+        """
+        indices, similarities = self.search_batch(np.atleast_2d(query_embedding), top_k)
+        return indices[0], similarities[0]
+
+    def search_batch(self, query_embeddings, top_k=5):
+        """
+        Wyszukuje top-k faktów dla wielu zapytań naraz.
+
+        Args:
+            query_embeddings: Embeddingi zapytań (n_queries, dim)
+            top_k: Liczba zwracanych faktów na zapytanie (int)
+
+        Returns:
+            tuple: (indeksy, podobieństwa) - tablice (n_queries, k), malejąco,
+                   podobieństwa dokładne (float32)
+        """
+        queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+        k = min(top_k, len(self))
+
+        candidates, _ = top_k_from_scores(self._coarse_scores(queries), k * self.rescore_factor)
+
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        similarities = np.empty((queries.shape[0], k), dtype=np.float32)
+
+        for row, (query, rows) in enumerate(zip(queries, candidates)):
+            # memmap wymaga rosnących indeksów, żeby czytać dysk sekwencyjnie
+            rows = np.sort(rows)
+            exact = np.asarray(self.matrix[rows]) @ query
+            local, local_scores = top_k_from_scores(exact[np.newaxis, :], k)
+            indices[row] = rows[local[0]]
+            similarities[row] = local_scores[0]
+
+        return indices, similarities
+
+
+# Dostępne backendy wyszukiwania; "exact" jest trybem referencyjnym.
+INDEX_BACKENDS = {
+    "exact": DenseRetriever,
+    "ivf": IVFRetriever,
+    "float16": QuantizedRetriever,
+    "int8": QuantizedRetriever,
+}
+
+
+def load_or_build_index(backend, embeddings, directory=None, fingerprint=None,
+                        normalized=True, **params):
+    """
+    Zwraca indeks wyszukiwania wybranego backendu.
+
+    Indeksy ANN zapisywane są w directory (obok embeddingów) i ponownie
+    wczytywane, dopóki fingerprint embeddingów i parametry się nie zmienią.
+
+    Args:
+        backend: Nazwa backendu z INDEX_BACKENDS ("exact" / "ivf" / "float16" / "int8")
+        embeddings: Macierz embeddingów (n_facts, dim)
+        directory: Katalog na zapisany indeks (None = bez zapisu)
+        fingerprint: Identyfikator embeddingów (np. EmbeddingStore.fingerprint)
+        normalized: Czy embeddingi są już znormalizowane
+        **params: Parametry backendu (np. n_lists, n_probe, rescore_factor)
+
+    Returns:
+        DenseRetriever / IVFRetriever / QuantizedRetriever
+    """
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Nieznany backend wyszukiwania: {backend}")
+
+    if backend == "exact":
+        return DenseRetriever(embeddings, normalized=normalized)
+
+    # kody liczone są jednym przejściem po macierzy - bez zapisu na dysk
+    if backend in ("float16", "int8"):
+        return QuantizedRetriever(embeddings, dtype=backend, normalized=normalized,
+                                  rescore_factor=params.get("rescore_factor", 4))
+
+    n_lists = params.get("n_lists")
+    n_probe = params.get("n_probe", 8)
+    path = None
+
+    if directory is not None and fingerprint is not None:
+        path = os.path.join(directory, f"{backend}_index.npz")
+        index = IVFRetriever.load(path, embeddings, fingerprint, n_probe=n_probe, normalized=normalized)
+        if index is not None and (n_lists is None or index.n_lists == n_lists):
+            return index
+
+    index = IVFRetriever(embeddings, n_lists=n_lists, n_probe=n_probe, normalized=normalized)
+    if path is not None:
+        os.makedirs(directory, exist_ok=True)
+        index.save(path, fingerprint)
+    return index
@@ -15,8 +15,7 @@ Przygotować prototyp asystenta realizującego wybrany przez studenta rodzaj akt
 # In[21]:
 
 
-from openai import OpenAI
-import json, re
+import asyncio, json, os, re, sys, threading, time
 from ipywidgets import widgets, VBox, HBox, Layout, Button
 from IPython.display import display, Markdown, clear_output
 from datetime import datetime
@@ -71,11 +70,53 @@ BOT_CONFIG = load_config()
 if BOT_CONFIG is None:
     raise Exception("Nie można uruchomić bota bez poprawnej konfiguracji!")  
 
+# Wspólny klient LLM z Embedding/llm_client.py: jeden klient AsyncOpenAI na endpoint z pulą
+# połączeń keep-alive (settings.http_pool), timeoutami (settings.http_timeouts) i limitem
+# równoległych zapytań (settings.endpoint_concurrency). run_sync wykonuje wersje *_async na pętli
+# w tle, uruchamianej przy pierwszym użyciu (działa także w Jupyterze).
+# Notebook uruchamiany jest z katalogu Simple_AI_assistant - wtedy nie ma __file__
+
+_HERE = os.path.dirname(os.path.abspath(globals().get("__file__", "Shop_assistant.py")))
+sys.path.insert(0, os.path.join(os.path.dirname(_HERE), "Embedding"))
+
+from conversation import ConversationHistory, compact_history
+from llm_client import ClientRegistry, is_endpoint_failure, run_sync
+
+_llm_registry = None
+_registry_lock = threading.Lock()
+
+def get_llm_registry():
+    """
+    Zwraca (i przy pierwszym użyciu tworzy) rejestr klientów LLM.
+    """
+    global _llm_registry
+
+    if _llm_registry is None:
+        with _registry_lock:
+            if _llm_registry is None:
+                _llm_registry = ClientRegistry(
+                    BOT_CONFIG['api_endpoints'],
+                    BOT_CONFIG['api_keys'],
+                    concurrency=BOT_CONFIG['settings'].get('endpoint_concurrency'),
+                    pool=BOT_CONFIG['settings'].get('http_pool'),
+                    timeouts=BOT_CONFIG['settings'].get('http_timeouts')
+                )
+    return _llm_registry
+
+def pool_stats():
+    """
+    Statystyki ponownego użycia połączeń per api_type.
+
+    Returns:
+        dict: api_type -> requests, connections_opened, reused, reuse_rate, open_connections, max_connections
+    """
+    return get_llm_registry().pool_stats()
+
 # fukcja do obsługi LM studio jak i OpenAI, która automatycznie wybiera odpowiedni endpoint na podstawie konfiguracji, przyjmuje różne parametry dla każdego modelu
 
-def call_model(messages, model_config):
+async def call_model_async(messages, model_config):
     """
-    Uniwersalna funkcja do wywoływania modeli.
+    Uniwersalna funkcja do wywoływania modeli (asynchroniczna).
 
     Args:
         messages: Lista wiadomości w formacie OpenAI
@@ -89,25 +130,31 @@ def call_model(messages, model_config):
     temperature = model_config['temperature']
     max_tokens = model_config['max_tokens']
 
-    # wybór opowiedniego endpointu i klucza API
-
-    base_url = BOT_CONFIG['api_endpoints'][api_type]
-    api_key = BOT_CONFIG['api_keys'][api_type]
+    # klient dla odpowiedniego endpointu i klucza API (tworzony raz, leniwie)
 
-    # klient dla tego wywołania
-
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    registry = get_llm_registry()
+    url = registry.acquire(api_type)
+    outcome = "cancelled"
 
     try:
         if BOT_CONFIG['settings']['debug_mode']:
             print(f"Wywołanie modelu: {model_name} (temp={temperature}, tokens={max_tokens})")
 
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+        # nie więcej niż endpoint_concurrency równoległych zapytań do endpointu
+        async with registry.semaphore(api_type, url):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = await registry.client(api_type, url).chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            except Exception as e:
+                outcome = "error" if is_endpoint_failure(e) else "rejected"
+                raise
+            outcome = "ok"
 
         answer = response.choices[0].message.content.strip()
 
@@ -120,10 +167,18 @@ def call_model(messages, model_config):
         if BOT_CONFIG['settings']['debug_mode']:
             print(f"BŁĄD API: {e}")
         raise Exception(f"Błąd wywołania modelu: {e}")
+    finally:
+        registry.release(api_type, url, outcome, time.perf_counter() - start if outcome == "ok" else None)
+
+def call_model(messages, model_config):
+    """
+    Synchroniczna wersja call_model_async.
+    """
+    return run_sync(call_model_async(messages, model_config))
 
 # Klasyfikator pytań
 
-def classify_question(question):
+async def classify_question_async(question):
     """
     Klasyfikuje pytanie użytkownika do jednej z kategorii.
 
@@ -160,7 +215,7 @@ def classify_question(question):
     ]
 
     try:
-        result = call_model(classification_prompt, BOT_CONFIG['models']['classifier'])
+        result = await call_model_async(classification_prompt, BOT_CONFIG['models']['classifier'])
 
         # Normalizuj odpowiedź
         result_clean = result.upper().strip()
@@ -177,6 +232,12 @@ def classify_question(question):
             print(f" Błąd klasyfikacji, domyślnie: off_topic. Błąd: {e}")
         return "off_topic"
 
+def classify_question(question):
+    """
+    Synchroniczna wersja classify_question_async.
+    """
+    return run_sync(classify_question_async(question))
+
 # Baza wiedzy 15 zdań. 
 
 knowledge_base = [
@@ -197,13 +258,15 @@ knowledge_base = [
     "Kontakt: pomoc@zielonydoom.pl lub czat na stronie."
 ]
 
-def generate_response(question, knowledge_base):
+async def generate_response_async(question, knowledge_base, history=None):
     """
     Generuje odpowiedź na pytanie używając bazy wiedzy.
 
     Args:
         question: Pytanie użytkownika (str)
         knowledge_base: Lista faktów o sklepie (list)
+        history: Historia rozmowy (prompty system / developer i dotychczasowe tury,
+                 przycięte do history_token_budget) - trafia do promptu; None = bez historii
 
     Returns: 
         str: Wygenerowana odpowiedź
@@ -224,6 +287,7 @@ def generate_response(question, knowledge_base):
                 "Odpowiadaj po polsku, zwięźle i profesjonalnie."
             )
         },
+        *(history or []),
         {
             "role": "user",
             "content": (
@@ -235,7 +299,7 @@ def generate_response(question, knowledge_base):
     ]
 
     try:
-        answer = call_model(response_prompt, BOT_CONFIG['models']['responder'])
+        answer = await call_model_async(response_prompt, BOT_CONFIG['models']['responder'])
         return answer
 
 
@@ -244,10 +308,16 @@ def generate_response(question, knowledge_base):
             print(f"⚠️ Błąd generowania odpowiedzi: {e}")
         return "Przepraszam, wystąpił problem techniczny. Spróbuj ponownie za chwilę."
 
+def generate_response(question, knowledge_base, history=None):
+    """
+    Synchroniczna wersja generate_response_async.
+    """
+    return run_sync(generate_response_async(question, knowledge_base, history))
+
 
 # Walidator odpowiedzi 
 
-def validate_response(question, response, knowledge_base):
+async def validate_response_async(question, response, knowledge_base):
     """
     Waliduje czy odpowiedź jest oparta na bazie wiedzy.
 
@@ -288,7 +358,7 @@ def validate_response(question, response, knowledge_base):
     ]
 
     try:
-        result = call_model(validation_prompt, BOT_CONFIG['models']['validator'])
+        result = await call_model_async(validation_prompt, BOT_CONFIG['models']['validator'])
 
         # Wyciągnij liczbę z odpowiedzi
         score = int(''.join(filter(str.isdigit, result)))
@@ -306,12 +376,20 @@ def validate_response(question, response, knowledge_base):
             print(f" Błąd walidacji: {e}, zakładam score=5")
         return 5
 
+def validate_response(question, response, knowledge_base):
+    """
+    Synchroniczna wersja validate_response_async.
+    """
+    return run_sync(validate_response_async(question, response, knowledge_base))
+
 # logika regeneracji 
 
-def get_final_response(question, knowledge_base):
+async def get_final_response_async(question, knowledge_base, history=None):
     """
     Generuje i waliduje odpowiedź z logiką retry (ponawiania prób).
 
+    history (jak w generate_response_async) trafia do promptu respondera.
+
     Algorytm:
     1. Pobierz ustawienia (próg akceptacji, liczba prób).
     2. W pętli (do max_retries):
@@ -340,10 +418,10 @@ def get_final_response(question, knowledge_base):
             print(f"\n--- Próba generacji {attempt + 1}/{max_retries} ---")
 
         # A. Generacja
-        current_response = generate_response(question, knowledge_base)
+        current_response = await generate_response_async(question, knowledge_base, history)
 
         # B. Walidacja
-        score = validate_response(question, current_response, knowledge_base)
+        score = await validate_response_async(question, current_response, knowledge_base)
 
         # Logika wyboru "najlepszej z najgorszych" (opcjonalnie)
         if score > best_score:
@@ -368,7 +446,11 @@ def get_final_response(question, knowledge_base):
     else:
         return fallback_response
 
-client = OpenAI(base_url="http://127.0.0.1:1234/v1", api_key="lm-studio")
+def get_final_response(question, knowledge_base, history=None):
+    """
+    Synchroniczna wersja get_final_response_async.
+    """
+    return run_sync(get_final_response_async(question, knowledge_base, history))
 
 # baza wiedzy (15 zdań)
 
@@ -399,52 +481,131 @@ developer_prompt = {
 
 # pamięć rozmowy
 
-conversation_history = [system_prompt, developer_prompt]
+def new_conversation():
+    """
+    Nowa historia rozmowy (same prompty systemowe) - np. dla osobnej sesji użytkownika.
 
-# konfiguracja zarządzania historią 
+    Returns:
+        ConversationHistory: Historia z tokenami liczonymi przy dodaniu wiadomości
+    """
+    return ConversationHistory([system_prompt, developer_prompt])
 
-MAX_HISTORY_PAIRS = 10
+conversation_history = new_conversation()
 
-def trim_conversation_history():
+# konfiguracja zarządzania historią: historia trafia do promptu respondera, więc jest przycinana
+# do budżetu tokenów jego modelu (settings.history_token_budget, klucz = nazwa modelu, "default" dla pozostałych)
 
-    # po 10 parach rozmowy (20 wiadomości) odcina historię, zachowując prompty systemowe
+DEFAULT_HISTORY_TOKEN_BUDGET = 2000
 
-    global conversation_history
+def history_token_budget(model_name=None):
+    """
+    Budżet tokenów historii dla modelu (domyślnie respondera).
 
-    # oddzielam prompty systemowe od rozmowy
-    system_messages = []
-    user_conversation = []
+    Returns:
+        int lub None (None = bez limitu)
+    """
+    if model_name is None:
+        model_name = BOT_CONFIG['models']['responder']['name']
+    budgets = BOT_CONFIG['settings'].get('history_token_budget', {})
+    if not isinstance(budgets, dict):
+        return budgets
+    return budgets.get(model_name, budgets.get('default', DEFAULT_HISTORY_TOKEN_BUDGET))
+
+def trim_conversation_history(history=None):
+    """
+    Przycina historię w miejscu do history_token_budget(), zachowując prompty systemowe.
 
-    for msg in conversation_history:
-        if msg["role"] in ["system", "developer"]:
-            system_messages.append(msg)
-        else:
-            user_conversation.append(msg)
+    Najstarsze tury zdejmowane są z początku (tokeny policzone przy dodaniu wiadomości);
+    zwykła lista jest liczona od zera i podmieniana w miejscu.
+
+    Args:
+        history: Historia sesji (None = globalna conversation_history)
+    """
+    if history is None:
+        history = conversation_history
 
-    # zachowanie tylko ostatnie max_history_pair * 2 wiadomości
+    if isinstance(history, ConversationHistory):
+        history.trim(history_token_budget())
+        return
 
-    max_messages = MAX_HISTORY_PAIRS * 2
+    counted = ConversationHistory(history, budget=history_token_budget())
+    if counted.trim():
+        history[:] = list(counted)
 
-    if len(user_conversation) > max_messages:
-        user_conversation = user_conversation[-max_messages:]
+def _record_turn(history, question, answer):
+    """Zapisuje parę pytanie-odpowiedź, przycina historię do budżetu i zleca kompakcję."""
+    history.append({"role": "user", "content": question})
+    history.append({"role": "assistant", "content": answer})
+    trim_conversation_history(history)
+    _schedule_compaction(history)
 
-    # zbudowanie nowej historii 
-    conversation_history = system_messages + user_conversation
+# Kompakcja historii (settings.history_compaction): historia jest częścią promptu respondera, więc
+# zamiast pozwolić jej rosnąć do budżetu, zadanie w tle streszcza wszystkie tury poza ostatnimi
+# compaction_keep_turns w jedno kroczące podsumowanie (najwyżej compaction_summary_tokens tokenów)
+
+compaction_stats = {"runs": 0, "failed": 0, "messages_compacted": 0}
+_stats_lock = threading.Lock()
+
+def _schedule_compaction(history):
+    """
+    Zleca kompakcję historii w tle, jeśli jest włączona i potrzebna (bez czekania na wynik).
+    """
+    settings = BOT_CONFIG['settings']
+    if not settings.get('history_compaction', False) or not isinstance(history, ConversationHistory):
+        return
+    if history.compaction_task is not None and not history.compaction_task.done():
+        return
+    if history.message_count <= settings.get('compaction_threshold_turns', 6) * 2:
+        return
+
+    keep_messages = settings.get('compaction_keep_turns', 2) * 2
+    history.compaction_task = asyncio.get_running_loop().create_task(_compact_history(history, keep_messages))
+
+async def _compact_history(history, keep_messages):
+    """
+    Streszcza starsze tury historii w kroczące podsumowanie (model: models.summarizer albo responder).
+    """
+    model_config = BOT_CONFIG['models'].get('summarizer', BOT_CONFIG['models']['responder'])
+
+    try:
+        compacted = await compact_history(history, keep_messages,
+                                          lambda prompt: call_model_async(prompt, model_config),
+                                          BOT_CONFIG['settings'].get('compaction_summary_tokens', 200))
+    except Exception as e:
+        with _stats_lock:
+            compaction_stats["failed"] += 1
+        if BOT_CONFIG['settings']['debug_mode']:
+            print(f"Błąd kompakcji historii: {e}")
+        return
+    if compacted is None:
+        return
+
+    with _stats_lock:
+        compaction_stats["runs"] += 1
+        compaction_stats["messages_compacted"] += compacted
+
+    if BOT_CONFIG['settings']['debug_mode']:
+        print(f"🗜️ Kompakcja historii: {compacted} wiadomości -> podsumowanie ({history.summary_tokens} tokenów)")
 
 
 # główna funkcja rozmowy
 
-def ask_bot(question: str) -> str:
+async def ask_bot_async(question: str, history=None) -> str:
     """
     Główna funkcja bota z 3-step pipeline.
 
+    history to historia rozmowy (osobna dla każdej sesji, np. new_conversation()
+    albo lista [system_prompt, developer_prompt]); None = globalna
+    conversation_history. Historia trafia do promptu respondera.
+
     Pipeline:
     1. Klasyfikacja pytania
     2. Generacja odpowiedzi, jeśli on_topic
     3. Walidacja + retry logic
     """
 
-    global conversation_history
+    if history is None:
+        history = conversation_history
 
     if BOT_CONFIG['settings']['debug_mode']:
         print(f"\n\n{'='*60}")
@@ -453,7 +614,7 @@ def ask_bot(question: str) -> str:
 
     # Klasyfikacja
 
-    category = classify_question(question)
+    category = await classify_question_async(question)
 
     if BOT_CONFIG['settings']['debug_mode']:
         print(f" Kategoria: {category}")
@@ -466,8 +627,7 @@ def ask_bot(question: str) -> str:
             "Jestem asystentem sklepu 'Zielony Doom' i odpowiadam tylko na pytania "
             "związane z roślinami, akcesoriami ogrodniczymi, dostawą lub zwrotami."
         )
-        conversation_history.append({"role": "user", "content": question})
-        conversation_history.append({"role": "assistant", "content": answer})
+        _record_turn(history, question, answer)
         return answer
 
     # obsługa off_topic
@@ -478,22 +638,25 @@ def ask_bot(question: str) -> str:
             "Mogę pomóc w wyborze roślin, pielęgnacji, akcesoriach, dostawie lub zwrotach. "
             "Czym mogę Ci dzisiaj pomóc? "
         )
-        conversation_history.append({"role": "user", "content": question})
-        conversation_history.append({"role": "assistant", "content": answer})
+        _record_turn(history, question, answer)
         return answer
 
     # Generacja + walidacja, jak mamy on_topic
 
-    answer = get_final_response(question, knowledge_base)
+    answer = await get_final_response_async(question, knowledge_base, history)
 
-    # zapis do historii
+    # zapis do historii i przycięcie do budżetu tokenów
 
-
-    conversation_history.append({"role": "user", "content": question})
-    conversation_history.append({"role": "assistant", "content": answer})
+    _record_turn(history, question, answer)
 
     return answer
 
+def ask_bot(question: str, history=None) -> str:
+    """
+    Synchroniczna wersja ask_bot_async.
+    """
+    return run_sync(ask_bot_async(question, history))
+
 
 # UI (ipywidgets)
 
@@ -528,7 +691,7 @@ def on_send_clicked(_):
 
 def on_reset_clicked(_):
     global conversation_history
-    conversation_history = [system_prompt, developer_prompt]
+    conversation_history = new_conversation()
     with chat_output:
         clear_output()
         display(Markdown("🆕 **Rozpoczęto nową rozmowę z asystentem _Zielony Doom_.**"))
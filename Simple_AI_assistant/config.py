@@ -39,7 +39,29 @@ config = {
     "settings": {
         "debug_mode": True,
         "max_retries": 2,
-        "validation_threshold": 7  
+        "validation_threshold": 7,
+        "endpoint_concurrency": {
+            "local": 4
+        },
+        "http_pool": {
+            "max_connections": 8,
+            "max_keepalive_connections": 8,
+            "keepalive_expiry": 30.0
+        },
+        "http_timeouts": {
+            "connect": 5.0,
+            "read": 60.0,
+            "write": 10.0,
+            "pool": 30.0
+        },
+        "history_token_budget": {
+            "default": 2000,
+            "qwen2.5-7b-instruct-1m": 4000
+        },
+        "history_compaction": True,
+        "compaction_threshold_turns": 6,
+        "compaction_keep_turns": 2,
+        "compaction_summary_tokens": 200
     }
 }
 
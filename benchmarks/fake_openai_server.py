@@ -0,0 +1,336 @@
+"""
+Lokalny serwer zgodny z OpenAI (/v1/chat/completions) do benchmarków.
+
+Zastępuje LM Studio (http://127.0.0.1:1234/v1) i gpt-4o: odpowiada
+deterministycznie, a czas odpowiedzi symuluje profil opóźnień:
+
+    czas = (ttft + prompt_tokens / prefill_rate + completion_tokens / token_rate) * jitter
+
+gdzie jitter to losowy mnożnik (rozkład log-normalny), a slots ogranicza
+liczbę zapytań obsługiwanych naraz (lokalny model zwykle liczy jedno
+zapytanie w danej chwili - reszta czeka w kolejce).
+
+Obsługiwane:
+- zwykłe odpowiedzi z usage (prompt_tokens, completion_tokens),
+- streaming (stream=True, SSE; tokeny w tempie token_rate, usage w ostatnim
+  fragmencie przy stream_options.include_usage),
+- tool calls: zapytanie z tools dostaje wywołania narzędzi przez tool_rounds
+  rund (liczonych wiadomościami "tool" po ostatnim pytaniu), potem odpowiedź tekstową.
+
+Treść odpowiedzi rozpoznawana jest po promptach asystentów z repozytorium
+(klasyfikator, walidator, przepisywanie pytań, połączony etap klasyfikacja +
+przepisanie z odpowiedzią JSON); pozostałe zapytania dostają odpowiedź
+o długości completion_tokens słów.
+
+Uruchomienie jako zastępstwo LM Studio:
+    python fake_openai_server.py --port 1234 --profile local-7b
+
+W kodzie (port 0 = wolny port):
+    server, base_url = start_server(profile="local-7b")
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ttft [s], prefill_rate i token_rate [tokeny/s] (None = bez opóźnienia), jitter (sigma log-normalna),
+# slots (równoległe zapytania)
+PROFILES = {
+    "instant": {"ttft": 0.0, "prefill_rate": None, "token_rate": None, "jitter": 0.0, "slots": 64},
+    "local-7b": {"ttft": 0.15, "prefill_rate": 800, "token_rate": 25, "jitter": 0.1, "slots": 1},
+    "local-7b-parallel": {"ttft": 0.15, "prefill_rate": 800, "token_rate": 20, "jitter": 0.1, "slots": 4},
+    "gpt-4o": {"ttft": 0.35, "prefill_rate": 5000, "token_rate": 80, "jitter": 0.25, "slots": 64},
+}
+
+ANSWER_WORDS = (
+    "Monstera lubi jasne stanowisko bez bezpośredniego słońca i podlewanie, "
+    "gdy wierzchnia warstwa ziemi przeschnie. Zamówienia wysyłamy w 24 godziny, "
+    "a dostawa kosztuje 15 zł."
+).split()
+
+OFF_TOPIC_WORDS = ("wybory", "mecz", "polityk", "piłk", "bitcoin", "giełd")
+MANIPULATION_WORDS = ("zignoruj", "prompt", "instrukcj", "jesteś teraz")
+
+TOOL_SEQUENCE = [
+    ("query_dataframe", {"table": "products", "operation": "select", "columns": ["name", "price", "stock"], "limit": 5}),
+    ("query_sql", {"query": "SELECT p.name, SUM(o.quantity) AS sold FROM orders o JOIN products p "
+                            "ON o.product_id = p.product_id GROUP BY p.name",
+                   "explanation": "Sprzedaż per produkt"}),
+    ("get_schema_info", {"table": "all"}),
+]
+
+
+def estimate_tokens(text):
+    """Zgrubna liczba tokenów (~4 znaki na token)."""
+    return max(1, len(text) // 4)
+
+
+def _category(question):
+    """Kategoria pytania wg słów kluczowych (jak klasyfikator LLM)."""
+    question = question.lower()
+    if any(word in question for word in MANIPULATION_WORDS):
+        return "MANIPULATION"
+    if any(word in question for word in OFF_TOPIC_WORDS):
+        return "OFF_TOPIC"
+    return "ON_TOPIC"
+
+
+def _message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+class FakeModel:
+    """Logika odpowiedzi i czasy generacji (wspólne dla wszystkich połączeń serwera)."""
+
+    def __init__(self, profile="instant", completion_tokens=60, tool_rounds=1, seed=0, **overrides):
+        """
+        Args:
+            profile: Nazwa profilu z PROFILES
+            completion_tokens: Długość zwykłej odpowiedzi (słowa)
+            tool_rounds: Liczba rund tool calls przed odpowiedzią tekstową
+            overrides: Nadpisania parametrów profilu (ttft, prefill_rate, token_rate, jitter, slots)
+        """
+        self.params = {**PROFILES[profile], **{k: v for k, v in overrides.items() if v is not None}}
+        self.completion_tokens = completion_tokens
+        self.tool_rounds = tool_rounds
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.params["slots"])
+        self._ids = itertools.count(1)
+        self.requests = 0
+
+    def jitter(self):
+        sigma = self.params["jitter"]
+        if not sigma:
+            return 1.0
+        with self._random_lock:
+            return self._random.lognormvariate(0.0, sigma)
+
+    def prefill_time(self, prompt_tokens):
+        rate = self.params["prefill_rate"]
+        return self.params["ttft"] + (prompt_tokens / rate if rate else 0.0)
+
+    def token_time(self):
+        rate = self.params["token_rate"]
+        return 1.0 / rate if rate else 0.0
+
+    def slot(self):
+        """Miejsce w kolejce serwera (context manager) - symuluje ograniczoną przepustowość modelu."""
+        return self._slots
+
+    def next_id(self):
+        return next(self._ids)
+
+    def reply(self, body):
+        """
+        Zwraca odpowiedź na zapytanie.
+
+        Returns:
+            tuple: ("text", treść) albo ("tool_calls", lista (nazwa, argumenty))
+        """
+        messages = body.get("messages", [])
+        system = _message_text(messages[0]) if messages else ""
+        last = _message_text(messages[-1]) if messages else ""
+
+        if body.get("tools"):
+            last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+            rounds = sum(1 for m in messages[last_user + 1:] if m.get("role") == "tool")
+            if rounds < self.tool_rounds:
+                name, arguments = TOOL_SEQUENCE[rounds % len(TOOL_SEQUENCE)]
+                return "tool_calls", [(name, arguments)]
+            return "text", self.answer_text()
+
+        if "klasyfikatorem i narzędziem do precyzowania" in system:
+            question = re.search(r'Pytanie użytkownika: "(.*)"', last)
+            question = question.group(1) if question else last
+            return "text", json.dumps({"category": _category(question), "rewritten_question": question},
+                                      ensure_ascii=False)
+        if "klasyfikatorem" in system:
+            question = re.search(r'"(.*)"', last, re.S)
+            return "text", _category(question.group(1) if question else last)
+        if "walidatorem" in system:
+            return "text", "9"
+        if "precyzowania" in system:
+            question = re.search(r'Pytanie użytkownika: "(.*)"', last)
+            return "text", question.group(1) if question else last
+        return "text", self.answer_text()
+
+    def answer_text(self):
+        words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.completion_tokens)]
+        return " ".join(words)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # bez opóźnień ACK między nagłówkami a treścią
+    model = None  # FakeModel - ustawiany w make_server
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        # klient zerwał połączenie (anulowana spekulacja, przegrane zapytanie zapasowe)
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = self.model
+        model.requests += 1
+
+        prompt_tokens = sum(estimate_tokens(_message_text(m)) for m in body.get("messages", []))
+        kind, content = model.reply(body)
+        if kind == "text":
+            completion_tokens = len(content.split())
+        else:
+            completion_tokens = sum(estimate_tokens(json.dumps(arguments)) for _, arguments in content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+
+        completion_id = f"chatcmpl-{model.next_id()}"
+        jitter = model.jitter()
+
+        with model.slot():
+            time.sleep(model.prefill_time(prompt_tokens) * jitter)
+            if body.get("stream"):
+                self._stream(body, completion_id, kind, content, usage, model.token_time() * jitter)
+                return
+            time.sleep(model.token_time() * jitter * completion_tokens)
+
+        if kind == "text":
+            message = {"role": "assistant", "content": content}
+            finish_reason = "stop"
+        else:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": f"call_{model.next_id()}", "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}}
+                for name, arguments in content
+            ]}
+            finish_reason = "tool_calls"
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def _stream(self, body, completion_id, kind, content, usage, token_time):
+        """Odpowiedź SSE (chunked): jeden fragment na słowo, w tempie token_rate."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, **extra):
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake-model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }, ensure_ascii=False)
+
+        if kind == "text":
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                send(chunk({"content": word if i == len(words) - 1 else word + " "}))
+                time.sleep(token_time)
+            finish_reason = "stop"
+        else:
+            for index, (name, arguments) in enumerate(content):
+                send(chunk({"tool_calls": [{"index": index, "id": f"call_{index}", "type": "function",
+                                            "function": {"name": name,
+                                                         "arguments": json.dumps(arguments, ensure_ascii=False)}}]}))
+            finish_reason = "tool_calls"
+
+        send(chunk({}, finish_reason))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send(json.dumps({"id": completion_id, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, **model_options):
+    """Tworzy serwer (niewystartowany) z własnym FakeModel."""
+    handler = type("FakeOpenAIHandler", (Handler,), {"model": FakeModel(**model_options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(host="127.0.0.1", port=0, **model_options):
+    """
+    Uruchamia serwer w wątku w tle.
+
+    Returns:
+        tuple: (serwer - server.shutdown() zatrzymuje, base_url np. "http://127.0.0.1:54321/v1")
+    """
+    server = make_server(host, port, **model_options)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalny serwer zgodny z OpenAI do benchmarków")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="local-7b")
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--tool-rounds", type=int, default=1)
+    parser.add_argument("--ttft", type=float)
+    parser.add_argument("--prefill-rate", type=float)
+    parser.add_argument("--token-rate", type=float)
+    parser.add_argument("--jitter", type=float)
+    parser.add_argument("--slots", type=int)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, profile=args.profile, completion_tokens=args.completion_tokens,
+                         tool_rounds=args.tool_rounds, ttft=args.ttft, prefill_rate=args.prefill_rate,
+                         token_rate=args.token_rate, jitter=args.jitter, slots=args.slots)
+    print(f"Serwer: http://{args.host}:{server.server_address[1]}/v1 (profil {args.profile})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Wielosesyjny serwis czatu (ASGI) dla asystentów sklepu "Zielony Doom".
+
+Jeden, rozgrzany proces (jeden model embeddingów, wspólne pule połączeń)
+obsługuje wiele równoległych rozmów: każda ma własną sesję w SessionStore,
+a asystenci dostają historię sesji zamiast globalnej conversation_history.
+
+Asystenci (--assistants):
+- rag: rag_engine.ask_bot_async / ask_bot_stream_async (Embedding),
+- data-analyst: DatabaseAssistant.ask (Data_Analyst_Function_Calling) - jeden
+  obiekt asystenta na sesję, wspólny klient OpenAI; synchroniczne ask
+  wykonywane jest w puli wątków.
+
+API (JSON):
+    GET    /health                 -> {"status": "ok", "assistants": [...]}
+    GET    /stats                  -> statystyki sesji
+    GET    /sessions               -> lista sesji
+    POST   /sessions               {"assistant": "rag"} -> {"session_id", "assistant"}
+    DELETE /sessions/{id}
+    POST   /chat                   {"message", "session_id"?, "assistant"?} -> {"session_id", "answer"}
+    POST   /chat/stream            jak /chat, odpowiedź jako Server-Sent Events (tylko rag)
+
+Bez session_id /chat zakłada nową sesję; nieznane lub wygasłe session_id
+daje 404 (klient wie, że kontekst rozmowy przepadł).
+
+Uruchomienie (wymaga uvicorn):
+    python server.py --assistants rag,data-analyst --port 8000
+    curl -s localhost:8000/chat -d '{"message": "Jak podlewać monsterę?"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from sessions import SessionStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _messages_size(messages):
+    """Przybliżony rozmiar historii w bajtach (treść UTF-8, bez współdzielonych promptów systemowych)."""
+    return sum(len(str(message.get("content") or "").encode("utf-8")) for message in messages
+               if message.get("role") not in ("system", "developer"))
+
+
+def rag_assistant(warm_up=True):
+    """
+    Asystent RAG: stan sesji to lista wiadomości z rag_engine.new_conversation().
+    """
+    sys.path.insert(0, os.path.join(ROOT, "Embedding"))
+    import rag_engine
+
+    if warm_up:
+        rag_engine.warm_up()
+
+    return {
+        "new": rag_engine.new_conversation,
+        "ask": lambda history, message: rag_engine.ask_bot_async(message, history=history),
+        "stream": lambda history, message: rag_engine.ask_bot_stream_async(message, history=history),
+        "size": _messages_size,
+    }
+
+
+def data_analyst_assistant(api_key, base_url=None, model="gpt-4o"):
+    """
+    Analityk danych: stan sesji to DatabaseAssistant (własna historia, wspólny klient OpenAI).
+    """
+    sys.path.insert(0, os.path.join(ROOT, "Data_Analyst_Function_Calling"))
+    import function_calling_data_analyst as analyst
+    from openai import OpenAI
+
+    client = OpenAI(api_key=api_key, base_url=base_url)
+
+    return {
+        "new": lambda: analyst.DatabaseAssistant(api_key, model=model, verbose=False, client=client),
+        "ask": lambda assistant, message: asyncio.to_thread(assistant.ask, message),
+        "stream": None,
+        "size": lambda assistant: _messages_size(assistant.conversation_history),
+    }
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if not event.get("more_body"):
+            break
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPError(400, "Niepoprawny JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Oczekiwano obiektu JSON")
+    return payload
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_app(assistants, store):
+    """
+    Tworzy aplikację ASGI.
+
+    Args:
+        assistants: Nazwa -> słownik z funkcjami new / ask / stream / size
+                    (np. z rag_assistant(), data_analyst_assistant())
+        store: SessionStore
+
+    Returns:
+        Aplikacja ASGI (async app(scope, receive, send))
+    """
+    default_assistant = next(iter(assistants))
+
+    def open_session(payload):
+        """Sesja z payloadu: istniejąca (session_id) albo nowa (assistant)."""
+        session_id = payload.get("session_id")
+        if session_id is not None:
+            session = store.get(session_id)
+            if session is None:
+                raise HTTPError(404, f"Nieznana lub wygasła sesja: {session_id}")
+            return session
+
+        name = payload.get("assistant", default_assistant)
+        if name not in assistants:
+            raise HTTPError(404, f"Nieznany asystent: {name}")
+        state = assistants[name]["new"]()
+        return store.create(name, state, size=assistants[name]["size"](state))
+
+    def message_of(payload):
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "Brak pola message")
+        return message.strip()
+
+    async def chat(payload):
+        message = message_of(payload)
+        session = open_session(payload)
+        assistant = assistants[session.assistant]
+        # tury jednej rozmowy po kolei, różne rozmowy równolegle
+        async with session.lock:
+            answer = await assistant["ask"](session.state, message)
+            store.touch(session, size=assistant["size"](session.state))
+        return {"session_id": session.id, "assistant": session.assistant, "answer": answer}
+
+    async def chat_stream(payload, send):
+        message = message_of(payload)
+        session = open_session(payload)
+        assistant = assistants[session.assistant]
+        if assistant["stream"] is None:
+            raise HTTPError(400, f"Asystent {session.assistant} nie obsługuje streamingu")
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache")]})
+
+        async def emit(event):
+            data = json.dumps(event, ensure_ascii=False)
+            await send({"type": "http.response.body", "body": f"data: {data}\n\n".encode("utf-8"),
+                        "more_body": True})
+
+        await emit({"type": "session", "session_id": session.id, "assistant": session.assistant})
+        async with session.lock:
+            try:
+                async for event in assistant["stream"](session.state, message):
+                    await emit(event)
+            except Exception as e:
+                await emit({"type": "error", "error": str(e)})
+            store.touch(session, size=assistant["size"](session.state))
+        await send({"type": "http.response.body", "body": b""})
+
+    async def sweeper():
+        # wygasłe sesje usuwane także bez ruchu na serwerze
+        interval = max((store.idle_ttl or 60) / 10, 1)
+        while True:
+            await asyncio.sleep(interval)
+            store.sweep()
+
+    async def lifespan(receive, send):
+        task = None
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                task = asyncio.create_task(sweeper())
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                if task is not None:
+                    task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        try:
+            if method == "GET" and path == "/health":
+                return await _send_json(send, 200, {"status": "ok", "assistants": list(assistants)})
+            if method == "GET" and path == "/stats":
+                return await _send_json(send, 200, store.stats())
+            if method == "GET" and path == "/sessions":
+                return await _send_json(send, 200, {"sessions": store.sessions()})
+            if method == "POST" and path == "/sessions":
+                payload = await _read_json(receive)
+                if "session_id" in payload:
+                    raise HTTPError(400, "POST /sessions tworzy nową sesję - bez session_id")
+                session = open_session(payload)
+                return await _send_json(send, 201, {"session_id": session.id, "assistant": session.assistant})
+            if method == "DELETE" and path.startswith("/sessions/"):
+                if not store.delete(path[len("/sessions/"):]):
+                    raise HTTPError(404, "Nieznana sesja")
+                return await _send_json(send, 200, {"deleted": True})
+            if method == "POST" and path == "/chat":
+                return await _send_json(send, 200, await chat(await _read_json(receive)))
+            if method == "POST" and path == "/chat/stream":
+                return await chat_stream(await _read_json(receive), send)
+            raise HTTPError(404, f"Nieznany adres: {method} {path}")
+
+        except HTTPError as e:
+            return await _send_json(send, e.status, {"error": e.message})
+        except Exception as e:
+            return await _send_json(send, 500, {"error": f"Błąd asystenta: {e}"})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wielosesyjny serwis czatu (ASGI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--assistants", default="rag", help="Lista asystentów: rag, data-analyst")
+    parser.add_argument("--idle-ttl", type=float, default=1800, help="Wygasanie sesji po bezczynności [s]")
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--max-memory-mb", type=float, default=64, help="Limit rozmiaru wszystkich historii [MB]")
+    parser.add_argument("--analyst-api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--analyst-base-url", default=None, help="Endpoint zgodny z OpenAI dla data-analyst")
+    parser.add_argument("--analyst-model", default="gpt-4o")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("Serwis wymaga uvicorn: pip install uvicorn")
+
+    assistants = {}
+    for name in (name.strip() for name in args.assistants.split(",") if name.strip()):
+        if name == "rag":
+            assistants[name] = rag_assistant()
+        elif name == "data-analyst":
+            assistants[name] = data_analyst_assistant(args.analyst_api_key, args.analyst_base_url,
+                                                      args.analyst_model)
+        else:
+            parser.error(f"Nieznany asystent: {name}")
+
+    store = SessionStore(idle_ttl=args.idle_ttl, max_sessions=args.max_sessions,
+                         max_bytes=int(args.max_memory_mb * 2**20))
+    uvicorn.run(create_app(assistants, store), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
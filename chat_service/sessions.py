@@ -0,0 +1,213 @@
+"""
+Magazyn sesji rozmów.
+
+Zamiast jednej, globalnej historii (conversation_history / jednego
+DatabaseAssistant) każda rozmowa dostaje własną sesję z losowym ID.
+Stan sesji (lista wiadomości albo obiekt asystenta) tworzy wywołujący;
+magazyn pilnuje tylko jego życia:
+
+- sesje nieużywane przez idle_ttl sekund wygasają,
+- liczba sesji (max_sessions) i przybliżony rozmiar wszystkich historii
+  (max_bytes) są ograniczone - po przekroczeniu wyrzucana jest najdawniej
+  używana sesja, która właśnie nie odpowiada na pytanie,
+- każda sesja ma blokadę asyncio, więc pytania w jednej rozmowie idą po
+  kolei, a różne rozmowy - równolegle.
+"""
+
+import asyncio
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class Session:
+    """Jedna rozmowa: ID, nazwa asystenta, stan (historia / asystent) i blokada tur."""
+
+    __slots__ = ("id", "assistant", "state", "created", "last_used", "size", "turns", "lock")
+
+    def __init__(self, session_id, assistant, state, now):
+        self.id = session_id
+        self.assistant = assistant
+        self.state = state
+        self.created = now
+        self.last_used = now
+        self.size = 0
+        self.turns = 0
+        self.lock = asyncio.Lock()
+
+    def info(self, now):
+        return {
+            "session_id": self.id,
+            "assistant": self.assistant,
+            "turns": self.turns,
+            "size_bytes": self.size,
+            "idle_s": now - self.last_used,
+            "age_s": now - self.created,
+        }
+
+
+class SessionStore:
+    """
+    Sesje rozmów z wygasaniem po bezczynności i limitem pamięci (LRU).
+
+    Przykład:
+        store = SessionStore(idle_ttl=1800, max_sessions=1000, max_bytes=64 * 2**20)
+        session = store.create("rag", rag_engine.new_conversation())
+        async with session.lock:
+            await rag_engine.ask_bot_async(question, history=session.state)
+            store.touch(session, size=history_size(session.state))
+        session = store.get(session_id)              # None = brak / wygasła
+    """
+
+    def __init__(self, idle_ttl=1800, max_sessions=1000, max_bytes=None, clock=time.monotonic):
+        """
+        Args:
+            idle_ttl: Czas bezczynności w sekundach, po którym sesja wygasa (None = bez wygasania)
+            max_sessions: Maksymalna liczba sesji
+            max_bytes: Limit sumarycznego rozmiaru sesji (None = bez limitu)
+            clock: Źródło czasu (do testów)
+        """
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._clock = clock
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._last_sweep = clock()
+
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _drop(self, session_id):
+        """Usuwa sesję (wywoływane pod blokadą)."""
+        session = self._sessions.pop(session_id)
+        self._total_bytes -= session.size
+        return session
+
+    def _sweep(self, now, force=False):
+        """Usuwa wygasłe sesje - najwyżej co idle_ttl / 10 (wywoływane pod blokadą)."""
+        if self.idle_ttl is None or (not force and now - self._last_sweep < self.idle_ttl / 10):
+            return
+        self._last_sweep = now
+        # kolejność LRU - wygasłe są na początku
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_ttl or session.lock.locked():
+                break
+            self._drop(session.id)
+            self.expired += 1
+
+    def _enforce_limits(self, keep):
+        """Wyrzuca najdawniej używane, wolne sesje ponad limity (wywoływane pod blokadą)."""
+        def over():
+            return (len(self._sessions) > self.max_sessions
+                    or (self.max_bytes is not None and self._total_bytes > self.max_bytes))
+
+        if not over():
+            return
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            if session_id == keep or session.lock.locked():
+                continue
+            self._drop(session_id)
+            self.evicted += 1
+            if not over():
+                return
+
+    def create(self, assistant, state, size=0):
+        """
+        Tworzy sesję z gotowym stanem.
+
+        Args:
+            assistant: Nazwa asystenta (np. "rag", "data-analyst")
+            state: Stan rozmowy (lista wiadomości albo obiekt asystenta)
+            size: Początkowy rozmiar stanu w bajtach
+
+        Returns:
+            Session
+        """
+        now = self._clock()
+        session = Session(secrets.token_urlsafe(16), assistant, state, now)
+        session.size = size
+        with self._lock:
+            self._sweep(now)
+            self._sessions[session.id] = session
+            self._total_bytes += size
+            self.created += 1
+            self._enforce_limits(keep=session.id)
+        return session
+
+    def get(self, session_id):
+        """
+        Zwraca sesję (i odświeża jej czas użycia) albo None, jeśli nie istnieje lub wygasła.
+        """
+        now = self._clock()
+        with self._lock:
+            self._sweep(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self.idle_ttl is not None and now - session.last_used >= self.idle_ttl and not session.lock.locked():
+                self._drop(session_id)
+                self.expired += 1
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def touch(self, session, size=None):
+        """
+        Zapisuje zakończoną turę: czas użycia i nowy rozmiar stanu (bajty).
+        """
+        with self._lock:
+            session.last_used = self._clock()
+            session.turns += 1
+            if session.id not in self._sessions:
+                return
+            self._sessions.move_to_end(session.id)
+            if size is not None:
+                self._total_bytes += size - session.size
+                session.size = size
+            self._enforce_limits(keep=session.id)
+
+    def delete(self, session_id):
+        """Usuwa sesję. Zwraca True, jeśli istniała."""
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def sweep(self):
+        """Usuwa wygasłe sesje od razu (np. z okresowego zadania w tle)."""
+        with self._lock:
+            self._sweep(self._clock(), force=True)
+
+    def sessions(self):
+        """Lista opisów sesji (od najdawniej używanej)."""
+        now = self._clock()
+        with self._lock:
+            return [session.info(now) for session in self._sessions.values()]
+
+    def stats(self):
+        with self._lock:
+            by_assistant = {}
+            for session in self._sessions.values():
+                by_assistant[session.assistant] = by_assistant.get(session.assistant, 0) + 1
+            return {
+                "sessions": len(self._sessions),
+                "by_assistant": by_assistant,
+                "total_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,67 @@
+"""
+Wspólna konfiguracja testów.
+
+Moduły repozytorium nie są pakietem - importują się nawzajem po nazwach
+(np. "from retrieval import ..."), więc katalogi z kodem trafiają do sys.path.
+"""
+
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("Embedding", "chat_service", "benchmarks"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class FakeClock:
+    """Ręcznie przesuwany zegar (clock= w SemanticAnswerCache, SessionStore, ClientRegistry)."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class HashEncoder:
+    """
+    Deterministyczny "model embeddingów": ten sam tekst - ten sam wektor.
+
+    Liczy wywołania i zakodowane teksty, żeby sprawdzać, że baza koduje tylko zmiany.
+    """
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.calls = 0
+        self.encoded = 0
+        self._vectors = {}
+
+    def vector(self, text):
+        if text not in self._vectors:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            self._vectors[text] = np.random.default_rng(seed).normal(size=self.dim)
+        return self._vectors[text]
+
+    def __call__(self, texts):
+        self.calls += 1
+        self.encoded += len(texts)
+        return np.array([self.vector(text) for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def encoder():
+    return HashEncoder()
@@ -0,0 +1,98 @@
+"""Testy SemanticAnswerCache: trafienia, TTL, LRU, unieważnianie i licznik generation."""
+
+import numpy as np
+import pytest
+
+from answer_cache import SemanticAnswerCache
+
+
+def vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+@pytest.fixture
+def cache(clock):
+    return SemanticAnswerCache(threshold=0.9, ttl=60, max_size=2, clock=clock)
+
+
+def test_similar_question_hits_and_distant_misses(cache):
+    cache.put(vec(1, 0, 0), "15 zł", fact_ids=[1])
+
+    assert cache.get(vec(0.99, 0.05, 0)) == "15 zł"
+    assert cache.get(vec(0, 1, 0)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put(vec(1, 0, 0), "15 zł", fact_ids=[1])
+
+    clock.advance(61)
+
+    assert cache.get(vec(1, 0, 0)) is None
+    assert cache.stats()["expired"] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put(vec(1, 0, 0), "a", fact_ids=[1])
+    cache.put(vec(0, 1, 0), "b", fact_ids=[2])
+    cache.get(vec(1, 0, 0))  # "a" używane niedawno
+
+    cache.put(vec(0, 0, 1), "c", fact_ids=[3])
+
+    assert cache.get(vec(0, 1, 0)) is None
+    assert cache.get(vec(1, 0, 0)) == "a"
+    assert cache.get(vec(0, 0, 1)) == "c"
+
+
+def test_changed_fact_invalidates_dependent_answers(cache):
+    cache.put(vec(1, 0, 0), "a", fact_ids=[1, 2])
+    cache.put(vec(0, 1, 0), "b", fact_ids=[3])
+
+    cache.invalidate_facts([2])
+
+    assert cache.get(vec(1, 0, 0)) is None
+    assert cache.get(vec(0, 1, 0)) == "b"
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_added_facts_clear_whole_cache(cache):
+    cache.put(vec(1, 0, 0), "a", fact_ids=[1])
+    cache.put(vec(0, 1, 0), "b", fact_ids=[3])
+
+    cache.invalidate_facts([7], added=True)
+
+    assert len(cache) == 0
+
+
+def test_every_change_bumps_generation(cache):
+    generation = cache.generation
+
+    cache.invalidate_facts([1])
+    cache.invalidate_facts([2], added=True)
+    cache.clear()
+
+    assert cache.generation == generation + 3
+
+
+def test_answer_built_before_change_is_not_stored(cache):
+    generation = cache.generation          # odczyt przed retrievalem
+    cache.invalidate_facts([1])            # zmiana bazy w trakcie generacji
+
+    cache.put(vec(1, 0, 0), "stara odpowiedź", fact_ids=[1], generation=generation)
+
+    assert len(cache) == 0
+    assert cache.stats()["stale_puts"] == 1
+
+    cache.put(vec(1, 0, 0), "nowa odpowiedź", fact_ids=[1], generation=cache.generation)
+    assert cache.get(vec(1, 0, 0)) == "nowa odpowiedź"
+
+
+def test_zero_size_disables_cache(clock):
+    cache = SemanticAnswerCache(max_size=0, clock=clock)
+
+    cache.put(vec(1, 0, 0), "a", fact_ids=[1])
+
+    assert len(cache) == 0
+    assert cache.get(vec(1, 0, 0)) is None
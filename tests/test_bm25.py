@@ -0,0 +1,73 @@
+"""Testy BM25: normalizacja polskiego tekstu, wyszukiwanie i fuzja rankingów."""
+
+import pytest
+
+from bm25 import BM25Index, fold_diacritics, reciprocal_rank_fusion, stem, tokenize, weighted_fusion
+
+
+def test_fold_diacritics():
+    assert fold_diacritics("Źdźbło ŻÓŁĆ ąęśń") == "zdzblo zolc aesn"
+
+
+@pytest.mark.parametrize("word", ["półki", "półkę", "półkach", "półkami"])
+def test_inflected_forms_share_stem(word):
+    assert tokenize(word) == ["polk"]
+
+
+def test_stem_keeps_minimum_length():
+    assert stem("domy") == "dom"
+    assert stem("oko") == "oko"  # stem krótszy niż 3 znaki - bez zmian
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("Czy macie półki na rośliny?") == ["polk", "roslin"]
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(1, "Półki na rośliny mają nośność 20 kg.")
+    index.add(2, "Dostawa kosztuje 15 zł.")
+    index.add(3, "Sansewierię podlewamy raz na dwa tygodnie.")
+    index.add(4, "Rośliny doniczkowe lubią jasne stanowisko.")
+    return index
+
+
+def test_search_matches_inflected_query(index):
+    hits = index.search("półkach")
+
+    assert [doc_id for doc_id, _ in hits] == [1]
+    assert index.coverage(1, "półkach na rośliny") == 1.0
+
+
+def test_search_ranks_by_matching_terms(index):
+    hits = index.search("rośliny na półkach")
+
+    assert [doc_id for doc_id, _ in hits] == [1, 4]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_remove_and_readd(index):
+    index.remove(1)
+    index.remove(99)  # brak dokumentu - ignorowany
+
+    assert index.search("półki") == []
+    assert len(index) == 3
+
+    index.add(1, "Półki ścienne.")
+    assert index.search("półki")[0][0] == 1
+
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+
+    assert fused[0] == 1
+    assert set(fused) == {1, 2, 3, 4}
+
+
+def test_weighted_fusion_respects_weights():
+    dense = [(1, 0.9), (2, 0.5)]
+    sparse = [(2, 10.0), (3, 1.0)]
+
+    assert weighted_fusion([dense, sparse], [1.0, 0.0])[0] == 1
+    assert weighted_fusion([dense, sparse], [0.0, 1.0])[0] == 2
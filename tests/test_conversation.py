@@ -0,0 +1,158 @@
+"""Testy ConversationHistory: budżet tokenów, przycinanie tur i podsumowanie."""
+
+import asyncio
+
+import pytest
+
+from conversation import SUMMARY_PREFIX, ConversationHistory, build_summary_prompt, compact_history
+
+SYSTEM = {"role": "system", "content": "Jesteś asystentem sklepu z roślinami."}
+
+
+def word_tokens(text):
+    """Licznik tokenów do testów: jedno słowo = jeden token."""
+    return len(text.split())
+
+
+def turn(i, words=10):
+    return [{"role": "user", "content": f"pytanie {i} " + "x " * (words - 2)},
+            {"role": "assistant", "content": f"odpowiedź {i} " + "y " * (words - 2)}]
+
+
+def make_history(turns, budget=None):
+    history = ConversationHistory([SYSTEM], budget=budget, count_tokens=word_tokens)
+    for i in range(turns):
+        history.extend(turn(i))
+    return history
+
+
+def test_tokens_counted_once_and_pinned_prompts_excluded():
+    history = make_history(3)
+
+    # 6 wiadomości x (10 słów + 4 narzutu)
+    assert history.tokens == 6 * 14
+    assert history.pinned_tokens == word_tokens(SYSTEM["content"]) + 4
+    assert list(history)[0] == SYSTEM
+    assert history.message_count == 6
+
+
+def test_trim_drops_oldest_whole_turns():
+    history = make_history(5)
+
+    removed = history.trim(budget=3 * 28)
+
+    assert removed == 4
+    assert history.tokens <= 3 * 28
+    assert history[0] == SYSTEM
+    assert history[1]["content"].startswith("pytanie 2")
+    assert history.usage()["trimmed_messages"] == 4
+
+
+def test_trim_keeps_last_turn_over_budget():
+    history = make_history(3)
+
+    history.trim(budget=1)
+
+    assert history.message_count == 2
+    assert history[1]["content"].startswith("pytanie 2")
+
+
+def test_trim_never_leaves_orphaned_answer():
+    history = ConversationHistory(budget=None, count_tokens=word_tokens)
+    history.append({"role": "assistant", "content": "Dzień dobry, w czym pomóc?"})
+    for i in range(3):
+        history.extend(turn(i))
+
+    history.trim(budget=2 * 28)
+
+    assert history[0]["role"] == "user"
+
+
+def test_clear_keeps_pinned_prompts():
+    history = make_history(2)
+
+    history.clear()
+
+    assert list(history) == [SYSTEM]
+    assert history.tokens == 0
+
+
+def test_apply_summary_replaces_candidates():
+    history = make_history(4)
+    messages, upto = history.compaction_candidates(keep_messages=2)
+
+    compacted = history.apply_summary("Klient pytał o podlewanie.", upto)
+
+    assert compacted == len(messages) == 6
+    assert history.message_count == 2
+    assert history[1] == {"role": "system", "content": SUMMARY_PREFIX + "Klient pytał o podlewanie."}
+    assert history[2]["content"].startswith("pytanie 3")
+    assert history.summary_tokens == word_tokens(history[1]["content"]) + 4
+
+
+def test_apply_summary_keeps_turns_added_during_compaction():
+    history = make_history(4)
+    _, upto = history.compaction_candidates(keep_messages=2)
+    history.extend(turn(4))  # nowa tura w trakcie streszczania
+
+    history.apply_summary("Podsumowanie.", upto)
+
+    assert [message["content"].split()[1] for message in list(history)[2:]] == ["3", "3", "4", "4"]
+
+
+def test_apply_summary_after_clear_is_ignored():
+    history = make_history(4)
+    _, upto = history.compaction_candidates(keep_messages=2)
+    history.clear()
+
+    assert history.apply_summary("Nieaktualne.", upto) == 0
+    assert history.summary is None
+
+
+def test_apply_summary_caps_summary_tokens():
+    history = make_history(4)
+    _, upto = history.compaction_candidates(keep_messages=2)
+
+    history.apply_summary("słowo " * 50, upto, max_tokens=20)
+
+    assert history.summary == " ".join(["słowo"] * 20)
+    assert history.usage()["summary_truncations"] == 1
+
+
+def test_compaction_candidates_keep_whole_turns():
+    history = make_history(3)
+
+    messages, _ = history.compaction_candidates(keep_messages=3)
+
+    # granica przesunięta do pytania - zachowane są 4 wiadomości
+    assert len(messages) == 2
+    assert history.compaction_candidates(keep_messages=10) is None
+
+
+def test_compact_history_uses_previous_summary():
+    history = make_history(4)
+    history.apply_summary("Wcześniej: monstera.", history.compaction_candidates(2)[1])
+    history.extend(turn(4))
+    history.extend(turn(5))
+    prompts = []
+
+    async def summarize(prompt):
+        prompts.append(prompt)
+        return "Monstera i dostawa. " + "z " * 100
+
+    compacted = asyncio.run(compact_history(history, 2, summarize, 30))
+
+    assert compacted == 4
+    assert "Wcześniej: monstera." in str(prompts[0])
+    assert word_tokens(history.summary) <= 30
+    assert prompts[0] == build_summary_prompt("Wcześniej: monstera.", list(turn(3) + turn(4)))
+
+
+@pytest.mark.parametrize("keep", [2, 4])
+def test_compact_history_without_candidates(keep):
+    history = make_history(1)
+
+    async def summarize(prompt):
+        raise AssertionError("nie powinno być wywołane")
+
+    assert asyncio.run(compact_history(history, keep, summarize, 30)) is None
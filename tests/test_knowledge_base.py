@@ -0,0 +1,141 @@
+"""Testy KnowledgeBase: przyrostowe zmiany, nagrobki i kompakcja."""
+
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from knowledge_base import KnowledgeBase
+
+FACTS = [
+    "Monstera lubi jasne stanowisko bez bezpośredniego słońca.",
+    "Dostawa kosztuje 15 zł, a powyżej 200 zł jest darmowa.",
+    "Zamówienia wysyłamy w ciągu 24 godzin.",
+    "Zwrot towaru jest możliwy w ciągu 14 dni.",
+    "Sansewierię podlewamy raz na dwa tygodnie.",
+    "Półki na rośliny mają nośność 20 kg.",
+]
+
+
+def make_kb(encoder, **options):
+    options.setdefault("compact_ratio", 10.0)  # bez automatycznej kompakcji, chyba że test jej chce
+    return KnowledgeBase(FACTS, encoder, **options)
+
+
+def top_id(kb, encoder, text):
+    return kb.search(encoder.vector(text), top_k=1)[0][0]
+
+
+def test_search_returns_fact_ids_with_descending_similarity(encoder):
+    kb = make_kb(encoder)
+
+    hits = kb.search(encoder.vector(FACTS[2]), top_k=3)
+
+    assert hits[0][0] == 2
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_add_encodes_only_new_facts(encoder):
+    kb = make_kb(encoder)
+    encoded = encoder.encoded
+
+    fact_id = kb.add("Fikus potrzebuje wilgotnego powietrza.")
+
+    assert encoder.encoded == encoded + 1
+    assert fact_id == len(FACTS)
+    assert top_id(kb, encoder, "Fikus potrzebuje wilgotnego powietrza.") == fact_id
+    assert len(kb) == len(FACTS) + 1
+
+
+def test_remove_leaves_tombstone_hidden_from_search(encoder):
+    kb = make_kb(encoder)
+
+    kb.remove(1)
+
+    assert kb.tombstones == 1
+    assert len(kb) == len(FACTS) - 1
+    assert 1 not in [fact_id for fact_id, _ in kb.search(encoder.vector(FACTS[1]), top_k=len(FACTS))]
+    with pytest.raises(KeyError):
+        kb.get(1)
+    with pytest.raises(KeyError):
+        kb.remove(1)
+
+
+def test_update_keeps_id_and_retires_old_version(encoder):
+    kb = make_kb(encoder)
+    new_text = "Dostawa kosztuje 19 zł."
+
+    kb.update(1, new_text)
+
+    assert kb.get(1) == new_text
+    assert kb.tombstones == 1
+    assert top_id(kb, encoder, new_text) == 1
+    # stara treść nie wraca w wynikach (ani jako osobny fakt, ani pod tym samym ID dwa razy)
+    ids = [fact_id for fact_id, _ in kb.search(encoder.vector(FACTS[1]), top_k=len(FACTS))]
+    assert ids.count(1) == 1
+    assert kb.find(FACTS[1]) is None
+
+
+def test_compact_removes_tombstones_and_keeps_results(encoder):
+    kb = make_kb(encoder)
+    kb.remove(0)
+    kb.update(3, "Zwrot towaru jest możliwy w ciągu 30 dni.")
+    kb.add("Fikus potrzebuje wilgotnego powietrza.")
+    queries = np.array([encoder.vector(text) for text in FACTS + ["Fikus potrzebuje wilgotnego powietrza."]])
+    before = kb.search_batch(queries, top_k=3)
+
+    kb.compact()
+
+    assert kb.tombstones == 0
+    assert kb.compactions == 1
+    assert kb.size == kb.indexed_count == len(kb) == len(FACTS)
+    assert kb.matrix.shape[0] == len(kb)
+    after = kb.search_batch(queries, top_k=3)
+    assert [[fact_id for fact_id, _ in hits] for hits in after] == [[fact_id for fact_id, _ in hits] for hits in before]
+    assert kb.get(3) == "Zwrot towaru jest możliwy w ciągu 30 dni."
+
+
+def test_automatic_compaction_after_ratio(encoder):
+    kb = make_kb(encoder, compact_ratio=0.25)
+
+    kb.remove(0)
+    assert kb.compactions == 0
+    kb.remove(1)  # 2 nagrobki > 0.25 * 6
+
+    assert kb.compactions == 1
+    assert kb.tombstones == 0
+    assert len(kb) == len(FACTS) - 2
+
+
+def test_listeners_get_changed_ids(encoder):
+    kb = make_kb(encoder)
+    events = []
+    kb.add_listener(lambda fact_ids, added: events.append((list(fact_ids), added)))
+
+    new_ids = kb.add_many(["a b c", "d e f"])
+    kb.update(2, "Zamówienia wysyłamy w ciągu 48 godzin.")
+    kb.remove(4)
+
+    assert events == [(new_ids, True), ([2], False), ([4], False)]
+
+
+def test_sparse_index_follows_changes(encoder):
+    kb = make_kb(encoder, sparse_index=BM25Index())
+
+    kb.remove(5)
+    kb.update(4, "Kaktusy podlewamy raz w miesiącu.")
+
+    assert kb.sparse_index.search("półki") == []
+    assert kb.sparse_index.search("kaktusy")[0][0] == 4
+
+
+def test_similarities_match_search_and_skip_removed(encoder):
+    kb = make_kb(encoder)
+    query = encoder.vector("Jak podlewać sansewierię?")
+    hits = kb.search(query, top_k=3)
+    kb.remove(hits[2][0])
+
+    scores = kb.similarities(query, [fact_id for fact_id, _ in hits])
+
+    assert scores[:2] == pytest.approx([score for _, score in hits[:2]], abs=1e-5)
+    assert scores[2] == 0.0
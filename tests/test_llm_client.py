@@ -0,0 +1,192 @@
+"""
+Testy ClientRegistry i wywołań LLM: wybór endpointu, zdrowie, zapytania zapasowe.
+
+Testy z siecią używają lokalnego serwera zgodnego z OpenAI
+(benchmarks/fake_openai_server.py) - bez LM Studio i kluczy API.
+"""
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+
+import rag_engine
+from fake_openai_server import start_server
+from llm_client import ClientRegistry, is_endpoint_failure, run_sync
+
+MODEL = {"name": "test-model", "temperature": 0.0, "max_tokens": 20, "api_type": "local"}
+
+
+def make_registry(urls, clock=time.monotonic, **options):
+    return ClientRegistry({"local": urls}, {"local": "test"}, clock=clock, **options)
+
+
+# --- wybór endpointu i zdrowie (bez sieci) ---
+
+def test_acquire_prefers_least_loaded_endpoint():
+    registry = make_registry(["a", "b"])
+
+    first = registry.acquire("local")
+    second = registry.acquire("local")
+    registry.release("local", first, "ok", 0.1)
+
+    assert {first, second} == {"a", "b"}
+    assert registry.acquire("local") == first
+    assert registry.acquire("local", exclude=[first, second]) is None
+
+
+def test_failures_put_endpoint_in_cooldown(clock):
+    registry = make_registry(["a", "b"], clock=clock, health={"failure_threshold": 2, "cooldown": 30})
+
+    for _ in range(2):
+        registry.release("local", registry.acquire("local", exclude=["b"]), "error")
+
+    assert not registry.endpoint_stats()["local"][0]["healthy"]
+    assert registry.acquire("local") == "b"
+    assert not registry.available("local", exclude=["b"])
+    assert registry.acquire("local", exclude=["b"], healthy_only=True) is None
+
+    clock.advance(31)
+    assert registry.available("local", exclude=["b"])
+
+
+def test_rejected_request_does_not_count_against_endpoint(clock):
+    registry = make_registry(["a"], clock=clock, health={"failure_threshold": 1})
+
+    registry.release("local", registry.acquire("local"), "rejected")
+
+    stats = registry.endpoint_stats()["local"][0]
+    assert stats["healthy"] and stats["errors"] == 0 and stats["outstanding"] == 0
+
+
+def test_all_unhealthy_picks_earliest_cooldown_end(clock):
+    registry = make_registry(["a", "b"], clock=clock, health={"failure_threshold": 1, "cooldown": 30})
+    registry.release("local", registry.acquire("local", exclude=["b"]), "error")
+    clock.advance(5)
+    registry.release("local", registry.acquire("local", exclude=["a"]), "error")
+
+    assert registry.acquire("local") == "a"
+
+
+def test_hedge_delay_is_latency_quantile():
+    registry = make_registry(["a"], hedging={"min_samples": 10, "quantile": 0.9, "min_delay": 0.05})
+
+    for i in range(1, 10):
+        registry.observe_latency("m", i / 10)
+    assert registry.hedge_delay("m") is None  # za mało pomiarów
+
+    registry.observe_latency("m", 1.0)
+    assert registry.hedge_delay("m") == pytest.approx(0.9)
+
+    fast = make_registry(["a"], hedging={"min_samples": 1, "min_delay": 0.25})
+    fast.observe_latency("m", 0.01)
+    assert fast.hedge_delay("m") == 0.25
+
+
+def test_is_endpoint_failure():
+    class StatusError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert is_endpoint_failure(ConnectionError())
+    assert is_endpoint_failure(StatusError(503))
+    assert is_endpoint_failure(StatusError(429))
+    assert not is_endpoint_failure(StatusError(400))
+
+
+# --- wywołania przez rag_engine.call_model_async na serwerze testowym ---
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**options):
+        server, base_url = start_server(**options)
+        started.append(server)
+        return base_url
+
+    yield start
+    for server in started:
+        server.shutdown()
+
+
+@pytest.fixture
+def dead_url():
+    """Adres, na którym nikt nie słucha (połączenie odrzucone)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """rag_engine z podanym rejestrem zamiast konfiguracji z config.json."""
+
+    def use(registry):
+        monkeypatch.setattr(rag_engine, "BOT_CONFIG", {"settings": {"debug_mode": False}})
+        monkeypatch.setattr(rag_engine, "_llm_registry", registry)
+        return registry
+
+    return use
+
+
+def call(times=1):
+    async def run():
+        answers = [await rag_engine.call_model_async([{"role": "user", "content": "Ile kosztuje dostawa?"}], MODEL)
+                   for _ in range(times)]
+        await rag_engine.get_llm_registry().aclose()
+        return answers
+
+    return asyncio.run(run())
+
+
+def test_calls_reuse_pooled_connection(servers, engine):
+    registry = engine(make_registry([servers(profile="instant")]))
+
+    answers = call(times=5)
+
+    assert all(answers)
+    stats = registry.pool_stats()["local"]
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+
+
+def test_dead_endpoint_fails_over_and_goes_unhealthy(servers, dead_url, engine):
+    live = servers(profile="instant")
+    registry = engine(make_registry([dead_url, live], health={"failure_threshold": 3, "cooldown": 60},
+                                    timeouts={"connect": 1.0}))
+
+    assert all(call(times=4))
+
+    dead, alive = registry.endpoint_stats()["local"]
+    assert dead["errors"] == 3 and not dead["healthy"]
+    assert alive["requests"] == 4 and alive["healthy"]
+    assert dead["outstanding"] == alive["outstanding"] == 0
+
+
+def test_slow_request_is_hedged_to_second_endpoint(servers, engine):
+    slow = servers(profile="instant", ttft=2.0)
+    fast = servers(profile="instant")
+    registry = engine(make_registry([slow, fast], hedging={"enabled": True, "min_samples": 1, "min_delay": 0.05}))
+    registry.observe_latency(MODEL["name"], 0.05)
+
+    start = time.perf_counter()
+    answer, = call()
+    elapsed = time.perf_counter() - start
+
+    assert answer
+    assert elapsed < 1.5
+    slow_stats, fast_stats = registry.endpoint_stats()["local"]
+    assert fast_stats["hedges"] == 1 and fast_stats["hedge_wins"] == 1
+    # przegrane zapytanie jest anulowane, a nie liczone jako błąd endpointu
+    assert slow_stats["errors"] == 0 and slow_stats["outstanding"] == 0
+
+
+def test_run_sync_uses_shared_background_loop(servers, engine):
+    engine(make_registry([servers(profile="instant")]))
+
+    assert run_sync(rag_engine.call_model_async([{"role": "user", "content": "Cześć"}], MODEL))
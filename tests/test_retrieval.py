@@ -0,0 +1,111 @@
+"""Testy indeksów wyszukiwania: dokładny, IVF (recall, zapis / odczyt) i kwantyzowany."""
+
+import os
+
+import numpy as np
+import pytest
+
+from retrieval import (DenseRetriever, IVFRetriever, QuantizedRetriever, load_or_build_index,
+                       normalize_embeddings)
+
+TOP_K = 10
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Embeddingi w skupiskach (jak prawdziwe fakty) i zapytania blisko losowych faktów."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, 64))
+    embeddings = centers[rng.integers(0, len(centers), 4000)] + 0.35 * rng.normal(size=(4000, 64))
+    queries = embeddings[rng.choice(len(embeddings), 50, replace=False)] + 0.1 * rng.normal(size=(50, 64))
+    return normalize_embeddings(embeddings), queries
+
+
+def recall(index, exact, queries):
+    """Średni udział dokładnych top-k odnalezionych przez indeks."""
+    found, _ = index.search_batch(queries, top_k=TOP_K)
+    expected, _ = exact.search_batch(queries, top_k=TOP_K)
+    return np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(found, expected)])
+
+
+def test_dense_search_is_exact(data):
+    embeddings, queries = data
+    index = DenseRetriever(embeddings, normalized=True)
+
+    indices, similarities = index.search_batch(queries, top_k=TOP_K)
+
+    scores = normalize_embeddings(queries) @ embeddings.T
+    expected = np.argsort(-scores, axis=1)[:, :TOP_K]
+    assert (indices == expected).all()
+    assert np.allclose(similarities, np.take_along_axis(scores, expected, axis=1), atol=1e-5)
+
+
+def test_ivf_recall(data):
+    embeddings, queries = data
+    exact = DenseRetriever(embeddings, normalized=True)
+
+    index = IVFRetriever(embeddings, n_lists=64, n_probe=8, normalized=True)
+
+    assert recall(index, exact, queries) >= 0.9
+
+
+def test_ivf_full_probe_is_exact(data):
+    embeddings, queries = data
+    exact = DenseRetriever(embeddings, normalized=True)
+
+    index = IVFRetriever(embeddings, n_lists=16, n_probe=16, normalized=True)
+
+    assert recall(index, exact, queries) == 1.0
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_recall_with_exact_rescoring(data, dtype):
+    embeddings, queries = data
+    exact = DenseRetriever(embeddings, normalized=True)
+
+    index = QuantizedRetriever(embeddings, dtype=dtype, normalized=True)
+
+    assert recall(index, exact, queries) >= 0.98
+    # re-scoring na float32 - podobieństwa dokładne
+    indices, similarities = index.search_batch(queries, top_k=TOP_K)
+    rescored = np.einsum("qkd,qd->qk", embeddings[indices], normalize_embeddings(queries))
+    assert np.allclose(similarities, rescored, atol=1e-5)
+    assert index.memory_bytes() < exact.memory_bytes()
+
+
+def test_quantized_rejects_unknown_dtype(data):
+    with pytest.raises(ValueError):
+        QuantizedRetriever(data[0], dtype="int4")
+
+
+def test_ivf_index_saved_and_reused(data, tmp_path):
+    embeddings, queries = data
+
+    built = load_or_build_index("ivf", embeddings, directory=tmp_path, fingerprint="v1", n_lists=32)
+    loaded = IVFRetriever.load(os.path.join(tmp_path, "ivf_index.npz"), embeddings, "v1")
+
+    assert loaded is not None
+    assert (loaded.search_batch(queries)[0] == built.search_batch(queries)[0]).all()
+    # inne embeddingi (fingerprint) - indeks do przebudowy
+    assert IVFRetriever.load(os.path.join(tmp_path, "ivf_index.npz"), embeddings, "v2") is None
+
+
+@pytest.mark.parametrize("damage", [
+    lambda raw: raw[:len(raw) // 2],
+    lambda raw: raw[:200] + bytes(byte ^ 0xFF for byte in raw[200:400]) + raw[400:],
+    lambda raw: b"",
+])
+def test_corrupt_ivf_file_is_rebuilt(data, tmp_path, damage):
+    embeddings, _ = data
+    load_or_build_index("ivf", embeddings, directory=tmp_path, fingerprint="v1", n_lists=32)
+    path = os.path.join(tmp_path, "ivf_index.npz")
+    with open(path, "rb") as f:
+        raw = f.read()
+    with open(path, "wb") as f:
+        f.write(damage(raw))
+
+    assert IVFRetriever.load(path, embeddings, "v1") is None
+    index = load_or_build_index("ivf", embeddings, directory=tmp_path, fingerprint="v1", n_lists=32)
+
+    assert isinstance(index, IVFRetriever)
+    assert IVFRetriever.load(path, embeddings, "v1") is not None
@@ -0,0 +1,89 @@
+"""Testy SessionStore: wygasanie po bezczynności i limity (LRU)."""
+
+import asyncio
+
+import pytest
+
+from sessions import SessionStore
+
+
+@pytest.fixture
+def store(clock):
+    return SessionStore(idle_ttl=100, max_sessions=3, max_bytes=1000, clock=clock)
+
+
+def test_get_refreshes_idle_timer(store, clock):
+    session = store.create("rag", [])
+
+    clock.advance(90)
+    assert store.get(session.id) is session
+    clock.advance(90)
+
+    assert store.get(session.id) is session
+
+
+def test_idle_session_expires(store, clock):
+    session = store.create("rag", [])
+
+    clock.advance(100)
+
+    assert store.get(session.id) is None
+    assert len(store) == 0
+    assert store.stats()["expired"] == 1
+
+
+def test_sweep_removes_only_expired(store, clock):
+    old = store.create("rag", [])
+    clock.advance(60)
+    fresh = store.create("data-analyst", [])
+    clock.advance(50)
+
+    store.sweep()
+
+    assert [info["session_id"] for info in store.sessions()] == [fresh.id]
+    assert store.get(old.id) is None
+
+
+def test_session_busy_with_question_does_not_expire(store, clock):
+    session = store.create("rag", [])
+
+    async def hold():
+        async with session.lock:
+            clock.advance(500)
+            store.sweep()
+            return store.get(session.id)
+
+    assert asyncio.run(hold()) is session
+
+
+def test_session_limit_evicts_least_recently_used(store):
+    first = store.create("rag", [])
+    second = store.create("rag", [])
+    third = store.create("rag", [])
+    store.get(first.id)
+
+    fourth = store.create("rag", [])
+
+    assert store.get(second.id) is None
+    assert {first.id, third.id, fourth.id} == {info["session_id"] for info in store.sessions()}
+    assert store.stats()["evicted"] == 1
+
+
+def test_byte_limit_evicts_but_keeps_current(store):
+    first = store.create("rag", [], size=400)
+    second = store.create("rag", [], size=400)
+
+    store.touch(second, size=900)
+
+    assert store.get(first.id) is None
+    assert store.get(second.id) is second
+    assert store.stats()["total_bytes"] == 900
+    assert second.turns == 1
+
+
+def test_delete(store):
+    session = store.create("rag", [], size=100)
+
+    assert store.delete(session.id)
+    assert not store.delete(session.id)
+    assert store.stats()["total_bytes"] == 0